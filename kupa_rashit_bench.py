@@ -0,0 +1,227 @@
+"""
+Benchmarks for the supermarket simulator (kupa_rashit_funs.py).
+Runs offline and writes machine-readable JSON so runs can be compared between commits.
+
+Suites:
+  date_range   rows/sec and peak memory of generate_data for 1 week / 1 month / 1 year
+  population   ROLE_CONFIG counts scaled 1x..50x (generate_data and batch emission)
+  polygons     PolygonSampler / AreaIndex cost against polygon vertex count
+  emission     scalar emit_points_for_segment vs the batch trajectory engine, one week of segments
+  writers      output writer throughput per --format
+
+Run:
+  python kupa_rashit_bench.py --out bench.json
+  python kupa_rashit_bench.py --quick --compare bench.json     # print ratios against an older run
+
+Every case runs in a fresh process so peak RSS (Unix only) is per case.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from multiprocessing import get_context
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+import kupa_rashit_funs as k
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(kb / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def count_rows(out_dir):
+    with open(os.path.join(out_dir, "geolocation.csv"), "rb") as fh:
+        return sum(1 for _ in fh) - 1
+
+# -------------------------
+# Cases (each runs in its own process)
+# -------------------------
+def bench_date_range(days, scale=1):
+    if scale != 1:
+        for cfg in k.ROLE_CONFIG.values():
+            cfg["count"] *= scale
+        k.rebuild_id_pools()
+    start = date(2024, 1, 1)
+    end = start + timedelta(days=days - 1)
+    with tempfile.TemporaryDirectory() as out_dir:
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            k.generate_data(start.isoformat(), end.isoformat(), out_dir)
+        seconds = time.perf_counter() - t0
+        rows = count_rows(out_dir)
+    return {"rows": rows, "seconds": seconds, "peak_rss_mb": peak_rss_mb()}
+
+def bench_emit_scaled(scale):
+    """Batch emission of one day's segments replicated over a population scaled by `scale`."""
+    for cfg in k.ROLE_CONFIG.values():
+        cfg["count"] *= scale
+    k.rebuild_id_pools()
+    d = date(2024, 1, 4)  # a Thursday
+    rng = random.Random(1)
+    segs = []
+    for role in ("repeat_customer", "one_time_customer", "not_paying"):
+        for cust_id in k.ID_POOLS[role][: 60 * scale]:
+            segs += [(cust_id, role, a, s, e) for a, s, e in k.plan_customer_trip(d, rng=rng)]
+    t0 = time.perf_counter()
+    rows = len(k.emit_points_for_segments(segs, rng=np.random.default_rng(1)))
+    return {"rows": rows, "seconds": time.perf_counter() - t0, "peak_rss_mb": peak_rss_mb()}
+
+def bench_emission(engine, days=7):
+    """One week of planned segments through the scalar per-point path or the batch trajectory engine."""
+    segs = []
+    for d in k.open_days("2024-01-01", (date(2024, 1, 1) + timedelta(days=days - 1)).isoformat()):
+        segs += k.plan_day(d, None, k.day_rngs(d)[0])[0]
+    t0 = time.perf_counter()
+    if engine == "scalar":
+        rng = random.Random(1)
+        rows = sum(len(k.emit_points_for_segment(*seg, rng=rng)) for seg in segs)
+    else:
+        rows = len(k.emit_points_for_segments(segs, rng=np.random.default_rng(1)))
+    return {"rows": rows, "seconds": time.perf_counter() - t0, "peak_rss_mb": peak_rss_mb()}
+
+def star_polygon(n_vertices, center=(32.0725, 34.7830), r_outer=0.002, r_inner=0.0008):
+    pts = []
+    for i in range(n_vertices):
+        r = r_outer if i % 2 == 0 else r_inner
+        a = 2 * math.pi * i / n_vertices
+        pts.append((center[0] + r * math.cos(a), center[1] + r * math.sin(a)))
+    return pts
+
+def bench_polygon(n_vertices, n_points=200_000):
+    poly = star_polygon(n_vertices)
+    t0 = time.perf_counter()
+    sampler = k.PolygonSampler(poly)
+    build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    lats, lons = sampler.sample(n_points, np.random.default_rng(1))
+    sample = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    index = k.AreaIndex({"STAR": poly})
+    index_build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    inside = index.classify_codes(lats, lons) == 0
+    classify = time.perf_counter() - t0
+    return {
+        "rows": n_points, "seconds": sample, "sampler_build_s": build,
+        "index_build_s": index_build, "classify_s": classify,
+        "classify_rows_per_sec": n_points / classify if classify else None,
+        "inside_fraction": float(inside.mean()), "peak_rss_mb": peak_rss_mb(),
+    }
+
+def bench_writer(fmt, days=14):
+    frames = [k.generate_day(d, k.ID_POOLS["repeat_customer"], k.SEED)[0]
+              for d in k.open_days("2024-01-01", (date(2024, 1, 1) + timedelta(days=days - 1)).isoformat())]
+    rows = sum(len(f) for f in frames)
+    writer = k.OUTPUT_FORMATS[fmt]
+    with tempfile.TemporaryDirectory() as out_dir:
+        t0 = time.perf_counter()
+        with writer(os.path.join(out_dir, "geolocation" + writer.suffix), k.GEO_COLUMNS) as out:
+            for f in frames:
+                out.write(f)
+                out.flush()
+        seconds = time.perf_counter() - t0
+    return {"rows": rows, "seconds": seconds, "peak_rss_mb": peak_rss_mb()}
+
+def suite(quick):
+    cases = [("date_range", "1 week", bench_date_range, (7,)),
+             ("date_range", "1 month", bench_date_range, (30,))]
+    if not quick:
+        cases.append(("date_range", "1 year", bench_date_range, (366,)))
+    for scale in (1, 10) if quick else (1, 5, 10, 50):
+        cases.append(("population", f"generate 1 week x{scale}", bench_date_range, (7, scale)))
+        cases.append(("population", f"emit 1 day x{scale}", bench_emit_scaled, (scale,)))
+    for engine in ("scalar", "batch"):
+        cases.append(("emission", engine, bench_emission, (engine,)))
+    for n in (8, 64, 256) if quick else (8, 64, 256, 1024):
+        cases.append(("polygons", f"{n} vertices", bench_polygon, (n,)))
+    for fmt in sorted(k.OUTPUT_FORMATS):
+        if fmt == "parquet" and not has_pyarrow():
+            continue
+        cases.append(("writers", fmt, bench_writer, (fmt,)))
+    return cases
+
+def has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def run_case(fn, args):
+    return fn(*args)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, old_path):
+    with open(old_path, encoding="utf-8") as fh:
+        old = {(r["bench"], r["case"]): r for r in json.load(fh)["results"]}
+    print(f"\nvs {old_path}:")
+    for r in results:
+        prev = old.get((r["bench"], r["case"]))
+        if prev and prev.get("rows_per_sec") and r.get("rows_per_sec"):
+            ratio = r["rows_per_sec"] / prev["rows_per_sec"]
+            flag = "  <-- slower" if ratio < 0.9 else ""
+            print(f"  {r['bench']:<11} {r['case']:<24} {ratio:6.2f}x{flag}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default="bench_results.json", help="JSON file for the results")
+    parser.add_argument("--quick", action="store_true", help="Skip the 1-year and 50x cases")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    results = []
+    for bench, case, fn, fn_args in suite(args.quick):
+        # max_tasks_per_child=1: a fresh interpreter per case, so peak RSS and module state don't leak
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn"), max_tasks_per_child=1) as pool:
+            r = pool.submit(run_case, fn, fn_args).result()
+        r = {"bench": bench, "case": case, **r}
+        r["rows_per_sec"] = r["rows"] / r["seconds"] if r["seconds"] else None
+        results.append(r)
+        print(f"{bench:<11} {case:<24} {r['rows']:>10,} rows {r['seconds']:8.3f}s "
+              f"{r['rows_per_sec'] or 0:>12,.0f} rows/s  peak {r['peak_rss_mb']} MB")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"[OK] Wrote {len(results)} results → {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -3,24 +3,219 @@ Supermarket geo + sales simulator
 Outputs:
   geolocation.csv: device_id, lat, lon, timestamp, accuracy_m, role, area
   log_sales.csv:   sale_id, timestamp, customer_id, subtotal, tax, total, payment_method
+  visits.csv:      visit_id, device_id, role, arrival, leave, dwell_minutes, areas, area_spans,
+                   sale_id, n_fixes, geo_rows  (ground truth, one row per device per day)
+  occupancy.csv:   timestamp (minute), one column per AREAS key: devices present
+  footfall.csv:    timestamp (hour), role, visitors
+  revenue.csv:     timestamp (hour), sales, subtotal, tax, revenue
+  The last three are aggregated from the planned segments/sales (summarize_day), so
+  --no-raw writes only them without emitting any points.
+
+Schema (CSV writes timestamps as ISO text "YYYY-MM-DDTHH:MM:SS"):
+  geolocation  device_id       string, dictionary-encoded in parquet
+               lat, lon        float64, degrees, 6 decimals
+               timestamp       second resolution; int64 timestamp[ms] in parquet
+               accuracy_m      float64, 0.0 for devices without GPS
+               role            string, dictionary-encoded in parquet (ROLE_CONFIG keys)
+               area            string, dictionary-encoded in parquet (AREAS keys)
+  log_sales    sale_id         string
+               timestamp       second resolution; int64 timestamp[ms] in parquet
+               customer_id     string, dictionary-encoded in parquet
+               subtotal, tax, total   float64 (tax = 18% of subtotal)
+               payment_method  string, dictionary-encoded in parquet (PAYMENT_METHODS)
+  visits       visit_id        string, "YYYYMMDD-<device_id>"
+               arrival, leave  second resolution, first segment start / last segment end
+               dwell_minutes   int64, leave - arrival
+               areas           string, segment areas in order joined by "|"
+               area_spans      string, "HH:MM-HH:MM" per segment joined by "|"
+               sale_id         string, the log_sales row of this visit ("" if none)
+               n_fixes         int64, geolocation rows of this visit
+               geo_rows        0-based data-row numbers in geolocation; space-separated in csv,
+                               list<int64> in parquet and binary
+
+Every output is in time order (timestamp; visits by arrival). --time-index adds geolocation_time_index.csv
+(hour, byte_offset, rows) so a reader can seek straight to a time window (read_time_window).
+
+With --format parquet each output is a directory partitioned by day:
+  geolocation/date=YYYY-MM-DD/part-00000.parquet, log_sales/date=YYYY-MM-DD/...
+
+With --format binary each output is a directory of fixed-width column files
+(geolocation.bin/lat.bin, ...) plus header.json with the code tables; open_binary()
+maps the columns as numpy.memmap without parsing (see BinaryStreamWriter).
 
 Run:
   python kupa_rashit_funs.py --start 2024-01-21 --end 2024-01-27 --out .
+  python kupa_rashit_funs.py --start 2024-01-01 --end 2024-12-31 --format parquet --workers 4
+  python kupa_rashit_funs.py --stores stores.json --out chain     # one shard per store, see StoreConfig
+  python kupa_rashit_funs.py --start 2020-01-01 --end 2024-12-31 --no-raw   # summary tables only
+  python kupa_rashit_funs.py --start 2024-01-21 --end 2024-01-27 --interval 15  # a detection chance every 15s
+  python kupa_rashit_funs.py --stream - --speed 60                 # time-ordered JSON lines, 1 simulated minute/sec
+  python kupa_rashit_funs.py --stream tcp://127.0.0.1:9000          # also unix:///path or a file (appended)
+  python kupa_rashit_funs.py --validate --out . --format csv        # certify a dataset, see validate_data
+  python kupa_rashit_funs.py --start 2020-01-01 --end 2024-12-31 --dry-run   # rows / bytes / runtime estimate
+
+stores.json is a list like:
+  [{"store_id": "tlv_01"},
+   {"store_id": "hfa_02", "role_scale": 2.0, "areas": {"CASH_REGISTERS": [[32.074, 34.785], ...]},
+    "opening_rules": {"6": ["08:00", "20:00"], "0": ["08:00", "20:00"]}, "holidays": ["2024-01-10"]}]
 
 Notes:
 - Replace the placeholder polygons below with your real ones (list of (lat, lon) tuples).
 - Store paths are Windows-friendly; default output is the current folder.
+- Devices move: each one walks between waypoints inside its area (leg_s in ROLE_CONFIG) and
+  every fix gets GPS noise scaled by its accuracy_m, kept inside the area (_walk, _gps_noise).
+- People are integer ids of a kupa_rushit_obj.Registry (people()); workers take yearly
+  leave per LEAVE_RULES and are not scheduled on those days (staff_on).
+- CSV output needs only numpy; pandas is imported on demand (parquet/binary output,
+  read_time_window, to_frame()).
 """
 
-import argparse
+import bisect
+import contextlib
+import functools
+import glob
+import csv
+import hashlib
+import heapq
+import importlib
+import io
+import json
 import math
 import os
+import pickle
 import random
-import uuid
+import shutil
+import sys
+import time as time_module
+import zlib
+from collections import deque
 from datetime import datetime, timedelta, time
-import pandas as pd
+from time import perf_counter
+import numpy as np
+
+from kupa_rushit_obj import Registry
+
+class _LazyModule:
+    """Stand-in for a heavy module; the real one is imported on first attribute access."""
+
+    def __init__(self, name, alias):
+        self._name, self._alias = name, alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
 
-random.seed(7)
+# pandas is only needed for parquet/binary output, read_time_window and to_frame(); the
+# default CSV path never imports it
+pd = _LazyModule("pandas", "pd")
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SEED = 7
+random.seed(SEED)
+NP_RNG = np.random.default_rng(SEED)
+
+# -------------------------
+# Profiling (--profile)
+# -------------------------
+class Profiler:
+    """
+    Wall time and call counts per named stage, plus grouped counters.
+    Disabled by default; stage() and count() do nothing until `enabled` is set.
+    Stage times are inclusive (generate_day contains the builders it calls).
+    """
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.stages = {}    # name -> [calls, seconds]
+        self.counters = {}  # group -> {key: n}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            st = self.stages.setdefault(name, [0, 0.0])
+            st[0] += 1
+            st[1] += perf_counter() - t0
+
+    def count(self, group, key, n=1):
+        if self.enabled:
+            g = self.counters.setdefault(group, {})
+            g[key] = g.get(key, 0) + n
+
+    def count_values(self, group, counts):
+        """Add a {key: n} mapping (e.g. GeoColumns.counts) to a counter group."""
+        if self.enabled:
+            for key, n in counts.items():
+                self.count(group, str(key), int(n))
+
+    def snapshot(self):
+        return {"stages": {k: list(v) for k, v in self.stages.items()},
+                "counters": {g: dict(c) for g, c in self.counters.items()}}
+
+    def pop_snapshot(self):
+        snap = self.snapshot()
+        self.reset()
+        return snap
+
+    def merge(self, snap):
+        for name, (calls, seconds) in snap["stages"].items():
+            st = self.stages.setdefault(name, [0, 0.0])
+            st[0] += calls
+            st[1] += seconds
+        for group, counts in snap["counters"].items():
+            for key, n in counts.items():
+                self.count(group, key, n)
+
+    def report(self):
+        stages = sorted(self.stages.items(), key=lambda kv: -kv[1][1])
+        return {
+            "stages": {name: {"calls": calls, "seconds": round(seconds, 4)} for name, (calls, seconds) in stages},
+            "counters": {g: dict(sorted(c.items())) for g, c in sorted(self.counters.items())},
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+PROFILER = Profiler()
+
+def profiled(fn):
+    """Record calls/time of fn as a PROFILER stage."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not PROFILER.enabled:
+            return fn(*args, **kwargs)
+        with PROFILER.stage(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def peak_rss_mb():
+    """Peak resident memory in MB of this process plus its largest finished worker; None if unknown.
+
+    The kernel only keeps the children's maximum, not a per-worker sum, so with several
+    workers alive at once this is a lower bound on the true total.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KB elsewhere
+
+def print_profile(report):
+    print("[PROFILE] stage                          calls    seconds")
+    for name, st in report["stages"].items():
+        print(f"[PROFILE] {name:<30} {st['calls']:>6} {st['seconds']:>10.3f}")
+    for group, counts in report["counters"].items():
+        print(f"[PROFILE] {group}: " + ", ".join(f"{k}={v:,}" for k, v in counts.items()))
+    print(f"[PROFILE] peak RSS (main + largest worker): {report['peak_rss_mb']} MB")
 
 # -------------------------
 # Polygon helpers
@@ -36,17 +231,99 @@ def point_in_polygon(point, polygon):
             inside = not inside
     return inside
 
-def random_point_in_polygon(polygon, max_iter=1000):
-    lats = [p[0] for p in polygon]
-    lons = [p[1] for p in polygon]
-    min_lat, max_lat = min(lats), max(lats)
-    min_lon, max_lon = min(lons), max(lons)
-    for _ in range(max_iter):
-        lat = random.uniform(min_lat, max_lat)
-        lon = random.uniform(min_lon, max_lon)
-        if point_in_polygon((lat, lon), polygon):
-            return (lat, lon)
-    return ((min_lat + max_lat) / 2.0, (min_lon + max_lon) / 2.0)
+@profiled
+def random_point_in_polygon(polygon, max_iter=None, *, rng=random):
+    """Uniform point inside polygon (exact, via a cached PolygonSampler; no rejection retries).
+    max_iter is accepted for old callers and ignored: nothing is retried any more."""
+    return polygon_sampler(polygon).sample_one(rng)
+
+def points_in_polygon(lats, lons, polygon):
+    """Vectorized point_in_polygon: boolean mask for arrays of lat/lon."""
+    inside = np.zeros(len(lats), dtype=bool)
+    n = len(polygon)
+    for i in range(n):
+        x1, y1 = polygon[i]
+        x2, y2 = polygon[(i + 1) % n]
+        inside ^= ((y1 > lons) != (y2 > lons)) & (lats < (x2 - x1) * (lons - y1) / (y2 - y1 + 1e-12) + x1)
+    return inside
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+def triangulate(polygon):
+    """
+    Ear-clipping triangulation of a simple polygon (convex or concave).
+    Returns a list of (a, b, c) vertex triples covering the polygon exactly.
+    """
+    pts = [tuple(map(float, p)) for p in polygon]
+    if len(pts) > 1 and pts[0] == pts[-1]:
+        pts = pts[:-1]
+    if sum(_cross(pts[0], pts[i], pts[i + 1]) for i in range(1, len(pts) - 1)) < 0:
+        pts.reverse()  # make counter-clockwise
+    idx = list(range(len(pts)))
+    tris = []
+    while len(idx) > 3:
+        for k in range(len(idx)):
+            a, b, c = pts[idx[k - 1]], pts[idx[k]], pts[idx[(k + 1) % len(idx)]]
+            turn = _cross(a, b, c)
+            if turn < 0:
+                continue  # reflex vertex
+            if turn > 0:
+                others = (pts[j] for j in idx if pts[j] not in (a, b, c))
+                if any(_cross(a, b, p) >= 0 and _cross(b, c, p) >= 0 and _cross(c, a, p) >= 0 for p in others):
+                    continue  # another vertex inside this ear
+                tris.append((a, b, c))
+            del idx[k]  # clip the ear (or drop a collinear vertex)
+            break
+        else:
+            raise ValueError("polygon is not simple; cannot triangulate")
+    if _cross(*(pts[i] for i in idx)) != 0:
+        tris.append(tuple(pts[i] for i in idx))
+    return tris
+
+class PolygonSampler:
+    """
+    Exact uniform sampler for one polygon.
+    The polygon is triangulated once; each draw picks a triangle weighted by area
+    and a uniform point inside it, so a point costs O(1) and nothing is rejected,
+    however thin or concave the polygon is.
+    """
+    def __init__(self, polygon):
+        tris = np.array(triangulate(polygon))  # (k, 3, 2)
+        self.a, self.b, self.c = tris[:, 0], tris[:, 1], tris[:, 2]
+        ab, ac = self.b - self.a, self.c - self.a
+        areas = np.abs(ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0]) / 2.0
+        self.area = float(areas.sum())
+        self.cum_weights = np.cumsum(areas) / self.area
+        self._cum_list = self.cum_weights.tolist()
+        pts = np.asarray(polygon, dtype=float)
+        turns = [_cross(pts[i - 1], pts[i], pts[(i + 1) % len(pts)]) for i in range(len(pts))]
+        self.convex = all(t >= 0 for t in turns) or all(t <= 0 for t in turns)  # straight walks stay inside
+
+    def sample(self, n, rng=None):
+        """Draw n points; returns (lats, lons) arrays."""
+        rng = NP_RNG if rng is None else rng
+        tri = np.minimum(np.searchsorted(self.cum_weights, rng.random(n), side="right"), len(self.a) - 1)
+        r1 = np.sqrt(rng.random(n))[:, None]
+        r2 = rng.random(n)[:, None]
+        pts = (1 - r1) * self.a[tri] + r1 * (1 - r2) * self.b[tri] + r1 * r2 * self.c[tri]
+        return pts[:, 0], pts[:, 1]
+
+    def sample_one(self, rng=random):
+        """Draw a single (lat, lon) with a random.Random-like rng."""
+        tri = min(bisect.bisect_right(self._cum_list, rng.random()), len(self._cum_list) - 1)
+        r1, r2 = math.sqrt(rng.random()), rng.random()
+        a, b, c = self.a[tri], self.b[tri], self.c[tri]
+        return tuple(float((1 - r1) * a[i] + r1 * (1 - r2) * b[i] + r1 * r2 * c[i]) for i in (0, 1))
+
+_SAMPLER_CACHE = {}
+
+def polygon_sampler(polygon):
+    """PolygonSampler for polygon, built once and cached by its vertices."""
+    key = tuple(map(tuple, polygon))
+    if key not in _SAMPLER_CACHE:
+        _SAMPLER_CACHE[key] = PolygonSampler(polygon)
+    return _SAMPLER_CACHE[key]
 
 # -------------------------
 # PLACEHOLDER POLYGONS — replace with your own
@@ -67,6 +344,119 @@ AREAS = {
     "HEAD_OFFICE": HEAD_OFFICE_POLYGON,
 }
 
+# preprocessed once; see PolygonSampler
+AREA_SAMPLERS = {k: polygon_sampler(p) for k, p in AREAS.items()}
+
+# Which label wins when areas overlap (e.g. CASH_REGISTERS inside SUPERMARKET inside PARKING):
+# earlier entries win; areas not listed come after, smallest first.
+AREA_PRIORITY = ["CASH_REGISTERS", "BUTCHERY", "HEAD_OFFICE", "WAREHOUSE", "SUPERMARKET", "PARKING"]
+
+def _segment_hits_boxes(p0, p1, xmin, xmax, ymin, ymax):
+    """Liang-Barsky: does segment p0-p1 touch each box? (vectorized over boxes)"""
+    dx, dy = p1[0] - p0[0], p1[1] - p0[1]
+    t0 = np.zeros(xmin.shape)
+    t1 = np.ones(xmin.shape)
+    hit = np.ones(xmin.shape, dtype=bool)
+    for p, q in ((-dx, p0[0] - xmin), (dx, xmax - p0[0]), (-dy, p0[1] - ymin), (dy, ymax - p0[1])):
+        if p == 0:
+            hit &= q >= 0
+        elif p < 0:
+            t0 = np.maximum(t0, q / p)
+        else:
+            t1 = np.minimum(t1, q / p)
+    return hit & (t0 <= t1)
+
+class AreaIndex:
+    """
+    Grid spatial index over named polygons for bulk point -> area lookups.
+    Every grid cell knows, per polygon, whether it is outside, fully inside or on the
+    boundary; only points in boundary cells go through the (vectorized) edge test.
+    Overlapping areas resolve by `priority` (see AREA_PRIORITY).
+    """
+    def __init__(self, areas, priority=AREA_PRIORITY, cells=64):
+        rest = sorted((a for a in areas if a not in priority), key=lambda a: polygon_sampler(areas[a]).area)
+        self.names = [a for a in priority if a in areas] + rest
+        self.polygons = [areas[a] for a in self.names]
+        pts = np.array([p for poly in self.polygons for p in poly], dtype=float)
+        self.lo, hi = pts.min(axis=0), pts.max(axis=0)
+        self.cells = cells
+        self.step = (hi - self.lo) / cells
+        self.step[self.step == 0] = 1.0
+
+        # cell boxes, then state per (polygon, cell): 0 outside, 1 inside, 2 boundary
+        edges_x = self.lo[0] + self.step[0] * np.arange(cells + 1)
+        edges_y = self.lo[1] + self.step[1] * np.arange(cells + 1)
+        xmin, ymin = np.meshgrid(edges_x[:-1], edges_y[:-1], indexing="ij")
+        xmax, ymax = np.meshgrid(edges_x[1:], edges_y[1:], indexing="ij")
+        self.state = np.zeros((len(self.polygons), cells, cells), dtype=np.int8)
+        for k, poly in enumerate(self.polygons):
+            boundary = np.zeros((cells, cells), dtype=bool)
+            for i in range(len(poly)):
+                boundary |= _segment_hits_boxes(poly[i], poly[(i + 1) % len(poly)], xmin, xmax, ymin, ymax)
+            inside = points_in_polygon(((xmin + xmax) / 2).ravel(), ((ymin + ymax) / 2).ravel(), poly)
+            self.state[k] = np.where(boundary, 2, inside.reshape(cells, cells).astype(np.int8))
+
+    def classify_codes(self, lats, lons):
+        """Index into self.names for each point, -1 where no area matches."""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        ci = np.floor((lats - self.lo[0]) / self.step[0]).astype(np.int64)
+        cj = np.floor((lons - self.lo[1]) / self.step[1]).astype(np.int64)
+        in_grid = (ci >= 0) & (ci < self.cells) & (cj >= 0) & (cj < self.cells)
+        codes = np.full(len(lats), -1, dtype=np.int64)
+        todo = np.flatnonzero(in_grid)
+        for k, poly in enumerate(self.polygons):
+            if not todo.size:
+                break
+            state = self.state[k, ci[todo], cj[todo]]
+            hit = state == 1
+            edge = np.flatnonzero(state == 2)
+            hit[edge] = points_in_polygon(lats[todo[edge]], lons[todo[edge]], poly)
+            codes[todo[hit]] = k
+            todo = todo[~hit]
+        return codes
+
+    def contains(self, name, lats, lons):
+        """Boolean mask of the points inside polygon `name` (grid first, edge test on boundary cells only)."""
+        return self.contains_codes(np.full(len(lats), self.names.index(name)), lats, lons)
+
+    def contains_codes(self, ks, lats, lons):
+        """contains() with a polygon per point: ks indexes self.names."""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        ci = np.floor((lats - self.lo[0]) / self.step[0]).astype(np.int64)
+        cj = np.floor((lons - self.lo[1]) / self.step[1]).astype(np.int64)
+        in_grid = (ci >= 0) & (ci < self.cells) & (cj >= 0) & (cj < self.cells)
+        state = np.zeros(len(lats), dtype=np.int8)
+        state[in_grid] = self.state[ks[in_grid], ci[in_grid], cj[in_grid]]
+        inside = state == 1
+        edge = np.flatnonzero(state == 2)
+        for k in np.unique(ks[edge]).tolist():
+            rows = edge[ks[edge] == k]
+            inside[rows] = points_in_polygon(lats[rows], lons[rows], self.polygons[k])
+        return inside
+
+    def classify(self, lats, lons):
+        """Area name for each point (None where no area matches)."""
+        labels = np.array(self.names + [None], dtype=object)
+        return labels[self.classify_codes(lats, lons)]
+
+_AREA_INDEX = None
+
+def classify_points(lats, lons):
+    """
+    Bulk area lookup against AREAS: arrays of lat/lon -> array of area names
+    (None outside every area). Nested areas resolve by AREA_PRIORITY.
+    """
+    return area_index().classify(lats, lons)
+
+def area_index():
+    """The AreaIndex over the current AREAS, built on first use."""
+    global _AREA_INDEX
+    if _AREA_INDEX is None:
+        _AREA_INDEX = AreaIndex(AREAS)
+    return _AREA_INDEX
+
 # -------------------------
 # Opening hours (Mon=0..Sun=6); Closed Saturday (Sat=5)
 # -------------------------
@@ -83,34 +473,233 @@ OPENING_RULES = {
 HOLIDAYS = {datetime(2024,1,23).date(), datetime(2024,5,26).date()}
 SPECIAL_DAYS = {datetime(2024,1,21).date(), datetime(2024,1,26).date()}
 
+TRAFFIC_SCALE = 1.0  # multiplies the daily customer counts; set per store in chain mode
+
 # -------------------------
 # Roles & staffing
 # -------------------------
+# leg_s: seconds between waypoints of the movement model (see _walk); accuracy_m: GPS accuracy range
 ROLE_CONFIG = {
-    "manager": {"count": 1, "accuracy_m": (5, 15)},
-    "cashier": {"count": 15, "accuracy_m": (3, 8)},
-    "butcher": {"count": 4, "accuracy_m": (3, 8)},
-    "delivery_guy": {"count": 8, "accuracy_m": (5, 15)},
-    "general_worker": {"count": 10, "accuracy_m": (4, 12)},
-    "senior_general_worker": {"count": 1, "accuracy_m": (4, 10)},
-    "security_guy": {"count": 4, "accuracy_m": (15, 40)},
-    "repeat_customer": {"count": 100, "accuracy_m": (5, 20)},
-    "one_time_customer": {"count": 400, "accuracy_m": (5, 20)},
-    "no_phone": {"count": 300, "accuracy_m": None},
-    "not_paying": {"count": 300, "accuracy_m": (5, 25)},
+    "manager": {"count": 2, "accuracy_m": (5, 15), "leg_s": 1200},  # the second id covers the manager's vacation
+    "cashier": {"count": 15, "accuracy_m": (3, 8), "leg_s": 1800},
+    "butcher": {"count": 4, "accuracy_m": (3, 8), "leg_s": 600},
+    "delivery_guy": {"count": 8, "accuracy_m": (5, 15), "leg_s": 300},
+    "general_worker": {"count": 10, "accuracy_m": (4, 12), "leg_s": 420},
+    "senior_general_worker": {"count": 1, "accuracy_m": (4, 10), "leg_s": 600},
+    "security_guy": {"count": 4, "accuracy_m": (15, 40), "leg_s": 900},
+    "repeat_customer": {"count": 100, "accuracy_m": (5, 20), "leg_s": 300},
+    "one_time_customer": {"count": 400, "accuracy_m": (5, 20), "leg_s": 300},
+    "no_phone": {"count": 300, "accuracy_m": None, "leg_s": 300},
+    "not_paying": {"count": 300, "accuracy_m": (5, 25), "leg_s": 300},
+}
+
+# Yearly leave per worker role: (vacation length in days, single days off), drawn once per
+# year by staff_on. The senior general worker comes every day and the replacement manager
+# (the role's last id) takes no leave.
+LEAVE_RULES = {
+    "manager": (7, 1),
+    "cashier": (7, 12),
+    "butcher": (7, 12),
+    "delivery_guy": (7, 12),
+    "general_worker": (7, 12),
+    "security_guy": (7, 12),
 }
 
-def role_accuracy(role):
-    rng = ROLE_CONFIG[role]["accuracy_m"]
-    if rng is None:
+def role_accuracy(role, rng=random):
+    acc = ROLE_CONFIG[role]["accuracy_m"]
+    if acc is None:
         return 0.0
-    lo, hi = rng
-    return random.uniform(lo, hi) 
+    lo, hi = acc
+    return rng.uniform(lo, hi)
 
 def make_ids(role, n):
     return [f"{role[:3]}_{i:03d}" for i in range(1, n+1)]
 
-ID_POOLS = {r: make_ids(r, ROLE_CONFIG[r]["count"]) for r in ROLE_CONFIG}
+_ID_STATE = None  # (ID_POOLS, DEVICE_CODES, CODE_TABLES, Registry), built on first use
+
+def _id_state():
+    global _ID_STATE
+    if _ID_STATE is None:
+        pools = {r: make_ids(r, ROLE_CONFIG[r]["count"]) for r in ROLE_CONFIG}
+        registry = Registry(pools)
+        codes = {d: i for i, d in enumerate(registry.names)}
+        _ID_STATE = (pools, codes, (tuple(registry.names), tuple(ROLE_CODES), tuple(AREA_CODES)), registry)
+    return _ID_STATE
+
+def id_pools():
+    """{role: [device ids]} for the current ROLE_CONFIG counts."""
+    return _id_state()[0]
+
+def device_codes():
+    """{device_id: code} over all roles' pools, in ROLE_CONFIG order."""
+    return _id_state()[1]
+
+def code_tables():
+    """(device_ids, roles, areas): code -> name tables of GeoColumns."""
+    return _id_state()[2]
+
+def people():
+    """The Registry (kupa_rushit_obj) of everyone in ROLE_CONFIG; its ids are the device codes."""
+    return _id_state()[3]
+
+def staff_on(d, seed=SEED):
+    """people() with every worker's leave for d's year drawn (LEAVE_RULES; depends only on seed and year)."""
+    registry = people()
+    if registry.leave_seed != seed:
+        registry.clear_leave(seed)
+    if d.year not in registry.leave_years:
+        rng = random.Random(f"leave-{seed}-{d.year}")
+        first = datetime(d.year, 1, 1).date()
+        n_days = (datetime(d.year + 1, 1, 1).date() - first).days
+        for role, (vacation, days_off) in LEAVE_RULES.items():
+            ids = registry.ids(role)
+            for pid in ids[:-1] if role == "manager" else ids:
+                start = first + timedelta(days=rng.randrange(n_days - vacation + 1))
+                registry.add_leave(pid, start, start + timedelta(days=vacation - 1), "vacation")
+                for day in rng.sample(range(n_days), days_off):
+                    registry.add_leave(pid, first + timedelta(days=day), first + timedelta(days=day), "day_off")
+        registry.leave_years.add(d.year)
+    return registry
+
+def available_ids(role, d, seed=SEED):
+    """Device ids of role not on leave on d (the whole pool for roles without LEAVE_RULES)."""
+    pool = id_pools()[role]
+    if role not in LEAVE_RULES:
+        return pool
+    registry = staff_on(d, seed)
+    base = registry.ids(role).start
+    return [pool[pid - base] for pid in registry.available(role, d)]
+
+def __getattr__(name):
+    # ID_POOLS, DEVICE_CODES and CODE_TABLES stay importable as module attributes, built lazily
+    lazy = {"ID_POOLS": 0, "DEVICE_CODES": 1, "CODE_TABLES": 2}
+    if name in lazy:
+        return _id_state()[lazy[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# -------------------------
+# Calendar
+# -------------------------
+CUSTOMER_COUNTS = {"one_time_customer": (3, 7), "not_paying": (10, 35), "no_phone": (15, 25)}  # visitors/day lo..hi
+ARRIVAL_HOURS = {3: (10, 12, 16, 18), 4: (8, 9, 11, 12, 13), None: (9, 11, 13, 17)}  # by weekday, None = other days
+
+def as_date(value):
+    return datetime.fromisoformat(value).date() if isinstance(value, str) else value
+
+class Calendar:
+    """
+    Schedule tables for every date in start..end (inclusive), built once with array ops
+    from OPENING_RULES, HOLIDAYS and SPECIAL_DAYS. Row i is start + i days.
+      weekday                    Python weekday (Mon=0 .. Sun=6)
+      holiday, special, closed   bool (closed = holiday or no OPENING_RULES entry)
+      open_min, close_min        opening hours in minutes after midnight (0 when closed)
+      staff                      {role: worker segments planned that day}
+      repeat_prob                chance that a repeat customer comes in
+    """
+
+    def __init__(self, start, end):
+        self.start, self.end = as_date(start), as_date(end)
+        self.days = np.arange(np.datetime64(self.start, "D"), np.datetime64(self.end, "D") + 1)
+        self.weekday = ((self.days.astype(np.int64) + 3) % 7).astype(np.int8)  # 1970-01-01 was a Thursday
+        self.holiday = np.isin(self.days, np.array(sorted(HOLIDAYS), dtype="datetime64[D]"))
+        self.special = np.isin(self.days, np.array(sorted(SPECIAL_DAYS), dtype="datetime64[D]"))
+        ruled = np.array([wd in OPENING_RULES for wd in range(7)])
+        open_min = np.array([_minutes(OPENING_RULES[wd][0]) if wd in OPENING_RULES else 0 for wd in range(7)])
+        close_min = np.array([_minutes(OPENING_RULES[wd][1]) if wd in OPENING_RULES else 0 for wd in range(7)])
+        self.closed = self.holiday | ~ruled[self.weekday]
+        is_open = ~self.closed
+        self.open_min = np.where(is_open, open_min[self.weekday], 0).astype(np.int32)
+        self.close_min = np.where(is_open, close_min[self.weekday], 0).astype(np.int32)
+
+        thu_fri = np.isin(self.weekday, (3, 4))
+        delivery = np.isin(self.weekday, (0, 3)) & ~self.holiday
+        self.staff = {
+            "manager": is_open.astype(np.int8),
+            "cashier": np.where(is_open, np.where(thu_fri, 4 + 2, 3), 0).astype(np.int8),  # shifts + peak pair
+            "butcher": 2 * is_open.astype(np.int8),
+            "delivery_guy": 2 * delivery.astype(np.int8),
+            "general_worker": 2 * is_open.astype(np.int8),
+            "senior_general_worker": is_open.astype(np.int8),
+            "security_guy": is_open.astype(np.int8),
+        }
+        base = np.where(thu_fri, 0.7, np.where(np.isin(self.weekday, (6, 0, 1, 2)), 0.35, 0.0))
+        self.repeat_prob = np.where(self.special, base + (1 - base) * 0.15, base)
+
+    def __len__(self):
+        return len(self.days)
+
+    def covers(self, d):
+        return self.start <= d <= self.end
+
+    def index(self, d):
+        return (d - self.start).days
+
+    def open_dates(self):
+        return self.days[~self.closed].astype(object).tolist()
+
+    def hours(self, d):
+        """(open_dt, close_dt) of d, or None when the store is closed."""
+        i = self.index(d)
+        if self.closed[i]:
+            return None
+        midnight = datetime.combine(d, time())
+        return (midnight + timedelta(minutes=int(self.open_min[i])),
+                midnight + timedelta(minutes=int(self.close_min[i])))
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+MINUTE_DELTAS = [timedelta(minutes=m) for m in range(24 * 60 + 1)]  # minute-of-day -> timedelta
+
+_CALENDAR = None
+
+def get_calendar(d):
+    """The cached Calendar covering d, rebuilt (for d's whole year) when d falls outside it."""
+    global _CALENDAR
+    if _CALENDAR is None or not _CALENDAR.covers(d):
+        _CALENDAR = Calendar(d.replace(month=1, day=1), d.replace(month=12, day=31))
+    return _CALENDAR
+
+def use_calendar(cal):
+    """Install a prebuilt Calendar (e.g. for the whole requested range) as the cache."""
+    global _CALENDAR
+    _CALENDAR = cal
+
+def day_hours(date_obj):
+    return get_calendar(date_obj).hours(date_obj)
+
+@profiled
+def plan_customers(cal, day_idx, roles, rng):
+    """
+    Vectorized plan_customer_trip for many customers at once: one day or a whole range.
+    day_idx: Calendar row of each customer; roles: ROLE_CODES of each customer;
+    rng: numpy Generator. Returns int arrays in minutes after midnight
+    (arrive, park_end, roam_end, pay_end); a leg is absent when its end is not after its start
+    (no parking: park_end == arrive, no roaming: roam_end == park_end, no paying: pay_end == roam_end).
+    """
+    n = len(day_idx)
+    wd = cal.weekday[day_idx]
+    by_weekday = [ARRIVAL_HOURS.get(w, ARRIVAL_HOURS[None]) for w in range(7)]
+    width = max(map(len, by_weekday))
+    hours = np.array([h + (0,) * (width - len(h)) for h in by_weekday])
+    pick = (rng.random(n) * np.array([len(h) for h in by_weekday])[wd]).astype(np.int64)
+    arrive = hours[wd, pick] * 60 + rng.integers(0, 60, n)
+    arrive = np.maximum(arrive, cal.open_min[day_idx] + rng.integers(0, 61, n))
+    # ARRIVAL_HOURS know nothing of a store's closing time: a late arrival comes in during
+    # the last half hour instead, keeping its minute as the spread (no extra draws).
+    close = cal.close_min[day_idx]
+    arrive = np.maximum(np.minimum(arrive, close - 2 - arrive % 30), cal.open_min[day_idx])
+
+    dwell = rng.integers(10, 91, n)
+    dwell += np.where((roles == ROLE_CODES["repeat_customer"]) & np.isin(wd, (3, 4)), rng.integers(15, 46, n), 0)
+    dwell += np.where(cal.special[day_idx], rng.integers(5, 21, n), 0)
+    leave = np.minimum(arrive + dwell, close - 1)
+
+    park_end = np.minimum(np.where(rng.random(n) < 0.8, arrive + rng.integers(2, 11, n), arrive), leave)
+    roam_end = np.maximum(np.minimum(leave - 1, park_end + np.maximum(3, dwell - 3)), park_end)
+    paying = (roles != ROLE_CODES["not_paying"]) & (roles != ROLE_CODES["no_phone"])
+    pay_end = np.where(paying, np.maximum(np.minimum(leave, roam_end + rng.integers(2, 11, n)), roam_end), roam_end)
+    return arrive, park_end, roam_end, pay_end
 
 # -------------------------
 # Shift builders
@@ -119,49 +708,48 @@ def dt(date_obj, t):
     return datetime.combine(date_obj, t)
 
 def clamp_to_open_hours(date_obj, start_dt, end_dt):
-    wd = date_obj.weekday()
-    if wd == 5 or date_obj in HOLIDAYS:
+    hours = day_hours(date_obj)
+    if not hours:
         return None
-    open_t, close_t = OPENING_RULES[wd]
-    day_open = dt(date_obj, open_t)
-    day_close = dt(date_obj, close_t)
+    day_open, day_close = hours
     start = max(day_open, start_dt)
     end = min(day_close, end_dt)
     if end <= start:
         return None
     return (start, end)
 
-def manager_shift(date_obj):
-    start = dt(date_obj, time(8, 0)) + timedelta(minutes=random.randint(-20, 30))
-    end = dt(date_obj, time(17, 0)) + timedelta(minutes=random.randint(-30, 30))
+@profiled
+def manager_shift(date_obj, rng=random):
+    start = dt(date_obj, time(8, 0)) + timedelta(minutes=rng.randint(-20, 30))
+    end = dt(date_obj, time(17, 0)) + timedelta(minutes=rng.randint(-30, 30))
     w = clamp_to_open_hours(date_obj, start, end)
     if not w:
         return []
     s, e = w
     segs, total = [], (e - s).seconds // 60
-    tour_points = sorted(random.sample(range(60, max(61, total-60)), k=2)) if total > 120 else []
+    tour_points = sorted(rng.sample(range(60, max(61, total-60)), k=2)) if total > 120 else []
     last = s
     for tp in tour_points + [total]:
         mid = s + timedelta(minutes=tp)
         segs.append(("HEAD_OFFICE", last, mid))
         if tp != total:
-            t_end = min(mid + timedelta(minutes=random.randint(10, 20)), e)
+            t_end = min(mid + timedelta(minutes=rng.randint(10, 20)), e)
             segs.append(("SUPERMARKET", mid, t_end))
             last = t_end
     return segs
 
-def cashier_shifts(date_obj):
-    wd = date_obj.weekday()
-    if wd == 5 or date_obj in HOLIDAYS:
+@profiled
+def cashier_shifts(date_obj, rng=random):
+    hours = day_hours(date_obj)
+    if not hours:
         return []
-    open_t, close_t = OPENING_RULES[wd]
-    base_start = dt(date_obj, open_t)
-    base_end = dt(date_obj, close_t)
+    wd = date_obj.weekday()
+    base_start, base_end = hours
     windows = []
     shift_count = 3 if wd not in (3,4) else 4
     for _ in range(shift_count):
-        dur_h = random.randint(6, 8)
-        start = base_start + timedelta(hours=random.randint(0, 6))
+        dur_h = rng.randint(6, 8)
+        start = base_start + timedelta(hours=rng.randint(0, 6))
         end = min(start + timedelta(hours=dur_h), base_end)
         w = clamp_to_open_hours(date_obj, start, end)
         if w:
@@ -174,69 +762,73 @@ def cashier_shifts(date_obj):
         if w: windows += [("CASH_REGISTERS", w[0], w[1])] * 2
     return windows
 
+@profiled
 def butchery_shifts(date_obj):
     wd = date_obj.weekday()
-    if wd == 5 or date_obj in HOLIDAYS:
+    if not day_hours(date_obj):
         return []
     if wd == 4: start, end = time(9,0), time(14,0)
     else:        start, end = time(10,0), time(19,0)
     w = clamp_to_open_hours(date_obj, dt(date_obj, start), dt(date_obj, end))
     return [("BUTCHERY", w[0], w[1]), ("BUTCHERY", w[0], w[1])] if w else []
 
-def delivery_shifts(date_obj):
+@profiled
+def delivery_shifts(date_obj, rng=random):
     wd = date_obj.weekday()
     if wd in (0, 3) and date_obj not in HOLIDAYS:
-        start = dt(date_obj, time(6, 0)) + timedelta(minutes=random.randint(-10, 10))
+        start = dt(date_obj, time(6, 0)) + timedelta(minutes=rng.randint(-10, 10))
         end = start + timedelta(minutes=30)
         return [("WAREHOUSE", start, end)]
     return []
 
+@profiled
 def general_worker_shifts(date_obj):
     wd = date_obj.weekday()
-    if wd == 5 or date_obj in HOLIDAYS:
+    if not day_hours(date_obj):
         return []
     end_h = 20 if wd in (6,0,1,2) else (22 if wd==3 else 15)
     w = clamp_to_open_hours(date_obj, dt(date_obj, time(8,0)), dt(date_obj, time(end_h,0)))
     return [("SUPERMARKET", w[0], w[1])] if w else []
 
+@profiled
 def senior_general_shift(date_obj):
     wd = date_obj.weekday()
-    if wd == 5 or date_obj in HOLIDAYS:
+    if not day_hours(date_obj):
         return []
     start = dt(date_obj, time(6, 0 if wd in (0,3) else 30))
     end = dt(date_obj, time(20,0))
     w = clamp_to_open_hours(date_obj, start, end)
     return [("SUPERMARKET", w[0], w[1])] if w else []
 
+@profiled
 def security_shift(date_obj):
-    wd = date_obj.weekday()
-    if wd == 5 or date_obj in HOLIDAYS:
-        return []
-    open_t, close_t = OPENING_RULES[wd]
-    return [("PARKING", dt(date_obj, open_t), dt(date_obj, close_t))]
+    hours = day_hours(date_obj)
+    return [("PARKING", *hours)] if hours else []
 
 # -------------------------
 # Customers
 # -------------------------
-def plan_customer_trip(date_obj, is_repeat=False, no_phone=False, not_paying=False, special=False):
+@profiled
+def plan_customer_trip(date_obj, is_repeat=False, no_phone=False, not_paying=False, special=False, rng=random):
+    """Scalar reference for one customer; plan_day uses the vectorized plan_customers."""
     wd = date_obj.weekday()
-    if wd == 5 or date_obj in HOLIDAYS: return []
-    open_t, close_t = OPENING_RULES[wd]
-    open_dt, close_dt = dt(date_obj, open_t), dt(date_obj, close_t)
+    hours = day_hours(date_obj)
+    if not hours: return []
+    open_dt, close_dt = hours
     if wd == 3:
-        base_arr = dt(date_obj, time(random.choice([10,12,16,18]), random.randint(0,59)))
+        base_arr = dt(date_obj, time(rng.choice([10,12,16,18]), rng.randint(0,59)))
     elif wd == 4:
-        base_arr = dt(date_obj, time(random.choice([8,9,11,12,13]), random.randint(0,59)))
+        base_arr = dt(date_obj, time(rng.choice([8,9,11,12,13]), rng.randint(0,59)))
     else:
-        base_arr = dt(date_obj, time(random.choice([9,11,13,17]), random.randint(0,59)))
-    base_arr = max(base_arr, open_dt + timedelta(minutes=random.randint(0, 60)))
-    dwell = random.randint(10, 90)
-    if is_repeat and wd in (3,4): dwell += random.randint(15,45)
-    if special: dwell += random.randint(5,20)
+        base_arr = dt(date_obj, time(rng.choice([9,11,13,17]), rng.randint(0,59)))
+    base_arr = max(base_arr, open_dt + timedelta(minutes=rng.randint(0, 60)))
+    dwell = rng.randint(10, 90)
+    if is_repeat and wd in (3,4): dwell += rng.randint(15,45)
+    if special: dwell += rng.randint(5,20)
     leave = min(base_arr + timedelta(minutes=dwell), close_dt - timedelta(minutes=1))
     segs = []
-    if random.random() < 0.8:
-        p_end = base_arr + timedelta(minutes=random.randint(2,10))
+    if rng.random() < 0.8:
+        p_end = base_arr + timedelta(minutes=rng.randint(2,10))
         segs.append(("PARKING", base_arr, p_end))
         start_market = p_end
     else:
@@ -246,165 +838,1775 @@ def plan_customer_trip(date_obj, is_repeat=False, no_phone=False, not_paying=Fal
         segs.append(("SUPERMARKET", start_market, roam_end))
     if (not not_paying) and (not no_phone):
         pay_start = roam_end
-        pay_end = min(leave, pay_start + timedelta(minutes=random.randint(2,10)))
+        pay_end = min(leave, pay_start + timedelta(minutes=rng.randint(2,10)))
         if pay_end > pay_start:
             segs.append(("CASH_REGISTERS", pay_start, pay_end))
     return segs
 
-def emit_points_for_segment(device_id, role, area_key, start_dt, end_dt, detect_prob=0.4):
+@profiled
+def emit_points_for_segment(device_id, role, area_key, start_dt, end_dt, detect_prob=0.4, rng=random):
+    """Scalar reference: an independent uniform point per detected minute; the batch engine (_emit_arrays) moves devices."""
     polygon = AREAS[area_key]
     ts = start_dt
     rows = []
     while ts <= end_dt:
-        if random.random() < detect_prob:
-            lat, lon = random_point_in_polygon(polygon)
+        if rng.random() < detect_prob:
+            lat, lon = random_point_in_polygon(polygon, rng=rng)
             rows.append({
                 "device_id": device_id,
                 "lat": round(lat, 6),
                 "lon": round(lon, 6),
                 "timestamp": ts.isoformat(),
-                "accuracy_m": round(role_accuracy(role), 1),
+                "accuracy_m": round(role_accuracy(role, rng), 1),
                 "role": role,
                 "area": area_key
             })
         ts += timedelta(minutes=1)
     return rows
 
+GEO_COLUMNS = ["device_id", "lat", "lon", "timestamp", "accuracy_m", "role", "area"]
+EPOCH = datetime(1970, 1, 1)
+MINUTE = timedelta(minutes=1)
+SECOND = timedelta(seconds=1)
+SAMPLE_SECONDS = 60   # one detection chance per device every SAMPLE_SECONDS (--interval)
+WALK_FRACTION = 0.5   # share of each leg spent walking to the next waypoint; the rest is spent standing there
+GPS_SIGMA = 1 / 1.51  # per-axis GPS noise sd as a share of accuracy_m (accuracy is the 68% radius)
+NOISE_TRIES = 4       # redraws of noise that lands outside the area before keeping the true position
+M_PER_DEG = 111_320.0
+
+# integer codes / fixed categories for the batch engine
+ROLE_CODES = {r: i for i, r in enumerate(ROLE_CONFIG)}
+AREA_CODES = {a: i for i, a in enumerate(AREAS)}
+
+def role_table(field, default=None):
+    """ROLE_CONFIG[role][field] for every role as an array indexed by ROLE_CODES, read at call time."""
+    return np.array([ROLE_CONFIG[r][field] or default for r in ROLE_CONFIG], dtype=float)
+
+def rebuild_id_pools():
+    """Rebuild ID_POOLS and the device code table (on next use) after editing ROLE_CONFIG counts."""
+    global _ID_STATE
+    _ID_STATE = None
+
+@profiled
+def _emit_arrays(segments, detect_prob, rng, interval=SAMPLE_SECONDS):
+    """
+    Core of the batch engine. Returns (seg_idx, ts, accuracy, lats, lons, role_codes, area_codes)
+    for the detected rows, grouped by segment and in time order within each segment.
+    ts is int64 epoch seconds; every segment has a detection chance each `interval` seconds.
+    Positions follow each device's trajectory (_walk) plus GPS noise scaled by its accuracy (_gps_noise).
+    """
+    devices, roles, areas, starts, ends = zip(*segments)
+    starts = np.array([(s - EPOCH) // SECOND for s in starts])
+    ends = np.array([(e - EPOCH) // SECOND for e in ends])
+    slots = np.maximum((ends - starts) // interval + 1, 0)
+
+    # one slot per (segment, sample time); keep the detected ones
+    seg_idx = np.repeat(np.arange(len(segments)), slots)
+    offsets = np.arange(len(seg_idx)) - np.repeat(np.cumsum(slots) - slots, slots)
+    hit = rng.random(len(seg_idx)) < detect_prob
+    seg_idx = seg_idx[hit]
+    elapsed = offsets[hit] * interval
+    ts = starts[seg_idx] + elapsed
+
+    seg_roles = np.array([ROLE_CODES[r] for r in roles])
+    seg_areas = np.array([AREA_CODES[a] for a in areas])
+    role_codes = seg_roles[seg_idx]
+    area_codes = seg_areas[seg_idx]
+    acc_lo, acc_hi = role_table("accuracy_m", (0.0, 0.0)).T
+    accuracy = np.round(rng.uniform(acc_lo[role_codes], acc_hi[role_codes]), 1)
+    lats, lons = _walk(seg_idx, elapsed, seg_roles, seg_areas, ends - starts, rng)
+    lats, lons = _gps_noise(lats, lons, accuracy, area_codes, rng)
+    return seg_idx, ts, accuracy, np.round(lats, 6), np.round(lons, 6), role_codes, area_codes
+
+def _inside_areas(area_codes, lats, lons):
+    """Mask of the points inside their own area (area_codes index AREAS)."""
+    index = area_index()
+    to_index = np.array([index.names.index(a) for a in AREA_CODES])
+    return index.contains_codes(to_index[area_codes], lats, lons)
+
+def _count_areas(group, area_codes):
+    """PROFILER.count rows per area name (area_codes index AREAS); nothing is computed when profiling is off."""
+    if PROFILER.enabled and len(area_codes):
+        for name, n in zip(AREA_CODES, np.bincount(area_codes, minlength=len(AREA_CODES)).tolist()):
+            if n:
+                PROFILER.count(group, name, n)
+
+@profiled
+def _walk(seg_idx, elapsed, seg_roles, seg_areas, durations, rng):
+    """
+    Waypoint movement of all segments at once: the position `elapsed` seconds into segment seg_idx.
+    Each segment visits uniform waypoints of its area, one leg of ROLE_CONFIG[role]["leg_s"] seconds each (random
+    phase): the device walks to the next waypoint for WALK_FRACTION of the leg and stands there for
+    the rest. Only the waypoints are drawn, positions are interpolated, so the cost is per detected
+    row whatever the interval. A walk cutting a concave corner snaps to the nearer waypoint.
+    """
+    leg = role_table("leg_s")[seg_roles]
+    phase = rng.random(len(seg_roles)) * leg
+    n_wp = ((durations + phase) // leg).astype(np.int64) + 2
+    first = np.cumsum(n_wp) - n_wp
+    wp_area = np.repeat(seg_areas, n_wp)
+    wp_lat = np.empty(len(wp_area))
+    wp_lon = np.empty(len(wp_area))
+    for area_key, code in AREA_CODES.items():
+        sel = wp_area == code
+        if sel.any():
+            wp_lat[sel], wp_lon[sel] = AREA_SAMPLERS[area_key].sample(int(sel.sum()), rng)
+            PROFILER.count("sampler_points", area_key, int(sel.sum()))
+
+    t = elapsed + phase[seg_idx]
+    row_leg = leg[seg_idx]
+    k = (t // row_leg).astype(np.int64)
+    frac = np.minimum((t - k * row_leg) / (row_leg * WALK_FRACTION), 1.0)
+    a = first[seg_idx] + k
+    lats = wp_lat[a] + (wp_lat[a + 1] - wp_lat[a]) * frac
+    lons = wp_lon[a] + (wp_lon[a + 1] - wp_lon[a]) * frac
+    concave = np.array([not AREA_SAMPLERS[a].convex for a in AREA_CODES])
+    walking = np.flatnonzero((frac < 1.0) & concave[seg_areas[seg_idx]])
+    outside = walking[~_inside_areas(seg_areas[seg_idx[walking]], lats[walking], lons[walking])]
+    if outside.size:
+        snap = a[outside] + (frac[outside] >= 0.5)
+        lats[outside], lons[outside] = wp_lat[snap], wp_lon[snap]
+        _count_areas("concave_snaps", seg_areas[seg_idx[outside]])
+    return lats, lons
+
+def _gps_noise(lats, lons, accuracy, area_codes, rng):
+    """Gaussian GPS error with sd GPS_SIGMA * accuracy_m per axis, redrawn while it leaves the area.
+    Profiled as noise_redraws and, for rows still outside after NOISE_TRIES, noise_kept_true."""
+    sigma = accuracy * GPS_SIGMA / M_PER_DEG
+    out_lat, out_lon = lats.copy(), lons.copy()
+    todo = np.flatnonzero(sigma > 0)
+    for attempt in range(NOISE_TRIES):
+        if not todo.size:
+            break
+        if attempt:
+            _count_areas("noise_redraws", area_codes[todo])
+        lat = lats[todo] + rng.normal(0.0, sigma[todo])
+        lon = lons[todo] + rng.normal(0.0, sigma[todo]) / np.cos(np.radians(lats[todo]))
+        ok = _inside_areas(area_codes[todo], lat, lon)
+        out_lat[todo[ok]], out_lon[todo[ok]] = lat[ok], lon[ok]
+        todo = todo[~ok]
+    _count_areas("noise_kept_true", area_codes[todo])
+    return out_lat, out_lon
+
+class GeoColumns:
+    """
+    Array-backed geolocation rows, the batch engine's internal representation.
+      device, role, area   int32 / int8 codes into tables = (device_ids, roles, areas)
+      lat, lon, accuracy   float64
+      ts                   int64 epoch seconds
+    About 38 bytes per row. Names and ISO timestamps only exist once to_frame() is called
+    at write time. store_id, when set, is added as a constant column.
+    """
+    __slots__ = ("device", "lat", "lon", "ts", "accuracy", "role", "area", "tables", "store_id")
+
+    def __init__(self, device, lat, lon, ts, accuracy, role, area, tables=None, store_id=None):
+        self.device = np.asarray(device, dtype=np.int32)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.accuracy = np.asarray(accuracy, dtype=np.float64)
+        self.role = np.asarray(role, dtype=np.int8)
+        self.area = np.asarray(area, dtype=np.int8)
+        self.tables = tables or code_tables()
+        self.store_id = store_id
+
+    @classmethod
+    def empty(cls):
+        return cls(*([()] * 7))
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, f).nbytes for f in ("device", "lat", "lon", "ts", "accuracy", "role", "area"))
+
+    def __getstate__(self):
+        return {f: getattr(self, f) for f in self.__slots__}
+
+    def __setstate__(self, state):
+        for f, v in state.items():
+            setattr(self, f, v)
+
+    @classmethod
+    def concat(cls, parts):
+        tables, store_id = parts[0].tables, parts[0].store_id
+        if any(p.tables != tables or p.store_id != store_id for p in parts):
+            raise ValueError("GeoColumns.concat needs parts with the same code tables and store_id")
+        cat = lambda f: np.concatenate([getattr(p, f) for p in parts])
+        return cls(cat("device"), cat("lat"), cat("lon"), cat("ts"), cat("accuracy"), cat("role"), cat("area"),
+                   tables, store_id)
+
+    def take(self, idx):
+        return GeoColumns(self.device[idx], self.lat[idx], self.lon[idx], self.ts[idx], self.accuracy[idx],
+                          self.role[idx], self.area[idx], self.tables, self.store_id)
+
+    def column(self, name):
+        """One GEO_COLUMNS column decoded for pandas (Categorical for names, datetime64[s] for timestamp)."""
+        codes = {"device_id": (self.device, 0), "role": (self.role, 1), "area": (self.area, 2)}
+        if name in codes:
+            values, table = codes[name]
+            return pd.Categorical.from_codes(values, categories=self.tables[table])
+        if name == "timestamp":
+            return self.ts.astype("datetime64[s]")
+        return {"lat": self.lat, "lon": self.lon, "accuracy_m": self.accuracy}[name]
+
+    def counts(self, name):
+        """{name: rows} for a coded column ("device_id", "role" or "area"), zeros included."""
+        values, table = {"device_id": (self.device, 0), "role": (self.role, 1), "area": (self.area, 2)}[name]
+        return dict(zip(self.tables[table], np.bincount(values, minlength=len(self.tables[table])).tolist()))
+
+    def to_frame(self):
+        df = pd.DataFrame({c: self.column(c) for c in GEO_COLUMNS}, columns=GEO_COLUMNS, copy=False)
+        if self.store_id is not None:
+            df.insert(0, "store_id", self.store_id)
+        return df
+
+class Records:
+    """
+    Row-oriented table for the small outputs (sales, visits): tuples in `columns` order.
+    store_id, when set, is added as a constant column when written.
+    """
+    __slots__ = ("columns", "rows", "store_id")
+
+    def __init__(self, columns, rows=(), store_id=None):
+        self.columns = list(columns)
+        self.rows = list(rows)
+        self.store_id = store_id
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def concat(cls, parts):
+        store_id = parts[0].store_id
+        if any(p.columns != parts[0].columns or p.store_id != store_id for p in parts):
+            raise ValueError("Records.concat needs parts with the same columns and store_id")
+        return cls(parts[0].columns, [row for p in parts for row in p.rows], store_id)
+
+    def column(self, name):
+        i = self.columns.index(name)
+        return [row[i] for row in self.rows]
+
+    def to_frame(self):
+        df = pd.DataFrame(self.rows, columns=self.columns)
+        if self.store_id is not None:
+            df.insert(0, "store_id", self.store_id)
+        return df
+
+@profiled
+def emit_points_for_segments(segments, detect_prob=0.4, rng=None, interval=SAMPLE_SECONDS):
+    """
+    Batch engine behind generate_day.
+    segments: list of (device_id, role, area_key, start_dt, end_dt) — one segment or a whole day.
+    Draws the detection mask, timestamps, accuracies and trajectory positions (_walk, _gps_noise)
+    as arrays, one detection chance per `interval` seconds, and returns GeoColumns ordered by
+    timestamp (ties keep segment order).
+    """
+    return _emit_sorted(segments, detect_prob, NP_RNG if rng is None else rng, interval)[0]
+
+def _emit_sorted(segments, detect_prob, rng, interval=SAMPLE_SECONDS):
+    """emit_points_for_segments, also returning the segment index of every row (for build_visits)."""
+    if not segments:
+        return GeoColumns.empty(), np.empty(0, dtype=np.int64)
+    seg_idx, ts, accuracy, lats, lons, role_codes, area_codes = _emit_arrays(segments, detect_prob, rng, interval)
+    with PROFILER.stage("emit.merge"):
+        # Each segment is already a time-ordered run; a stable sort merges the runs (timsort)
+        order = np.argsort(ts, kind="stable")
+        seg_idx, ts, accuracy, lats, lons, role_codes, area_codes = (
+            a[order] for a in (seg_idx, ts, accuracy, lats, lons, role_codes, area_codes))
+    codes = device_codes()
+    devices = np.array([codes[seg[0]] for seg in segments])[seg_idx]
+    return GeoColumns(devices, lats, lons, ts, accuracy, role_codes, area_codes), seg_idx
+
 PAYMENT_METHODS = ["cash", "credit_card", "debit_card", "mobile_pay"]
+TAX_RATE = 0.18
 
-def purchase_amount_from_dwell(dwell_minutes):
-    base = random.uniform(10, 30)
-    amt = base + math.sqrt(max(0, dwell_minutes)) * random.uniform(2.0, 6.0)
+def purchase_amount_from_dwell(dwell_minutes, rng=random):
+    base = rng.uniform(10, 30)
+    amt = base + math.sqrt(max(0, dwell_minutes)) * rng.uniform(2.0, 6.0)
     return max(5.0, min(amt, 600.0))
 
-def build_sale(customer_id, ts, dwell_minutes):
-    subtotal = round(purchase_amount_from_dwell(dwell_minutes), 2)
-    tax = round(subtotal * 0.18, 2)
+@profiled
+def build_sale(customer_id, ts, dwell_minutes, rng=random):
+    subtotal = round(purchase_amount_from_dwell(dwell_minutes, rng), 2)
+    tax = round(subtotal * TAX_RATE, 2)
     total = round(subtotal + tax, 2)
     return {
-        "sale_id": str(uuid.uuid4())[:8],
+        "sale_id": f"{rng.getrandbits(32):08x}",
         "timestamp": ts.isoformat(),
         "customer_id": customer_id,
         "subtotal": subtotal,
         "tax": tax,
         "total": total,
-        "payment_method": random.choice(PAYMENT_METHODS),
+        "payment_method": rng.choice(PAYMENT_METHODS),
     }
 
-def generate_data(start_date, end_date, out_dir):
+SALES_COLUMNS = ["sale_id", "timestamp", "customer_id", "subtotal", "tax", "total", "payment_method"]
+
+@profiled
+def build_sales(customer_ids, timestamps, dwell_minutes, rng):
+    """Vectorized build_sale for a batch of customers (rng: numpy Generator); returns a list of sale dicts."""
+    n = len(customer_ids)
+    amount = rng.uniform(10, 30, n) + np.sqrt(np.maximum(0, dwell_minutes)) * rng.uniform(2.0, 6.0, n)
+    subtotal = np.round(np.clip(amount, 5.0, 600.0), 2)
+    tax = np.round(subtotal * TAX_RATE, 2)
+    total = np.round(subtotal + tax, 2)
+    sale_ids = rng.integers(0, 2**32, n, dtype=np.uint64).tolist()
+    methods = rng.integers(0, len(PAYMENT_METHODS), n).tolist()
+    return [dict(zip(SALES_COLUMNS, (f"{sid:08x}", ts.isoformat(), cid, st, tx, tt, PAYMENT_METHODS[m])))
+            for sid, ts, cid, st, tx, tt, m in zip(sale_ids, timestamps, customer_ids, subtotal.tolist(),
+                                                   tax.tolist(), total.tolist(), methods)]
+
+# -------------------------
+# Output
+# -------------------------
+class StreamWriter:
+    """
+    Append-only output with bounded memory.
+    Frames (GeoColumns, Records or DataFrames) passed to write() are buffered and handed to _write_frame() once
+    flush_rows rows are pending (or on flush()/close()); nothing else is kept in memory.
+    """
+    suffix = ""
+    TIME_COLUMNS = ("timestamp", "arrival", "leave")  # stored as timestamps; the first one present orders/partitions
+    LIST_COLUMNS = ("geo_rows",)  # one int array per row
+    native_columns = False  # True if _write_frame takes GeoColumns / Records as they are
+
+    def __init__(self, path, columns, flush_rows=None):
+        self.path = path
+        self.columns = columns
+        self.flush_rows = flush_rows
+        self.rows = 0
+        self._pending, self._pending_rows = [], 0
+        self.time_column = next(c for c in columns if c in self.TIME_COLUMNS)
+
+    @property
+    def total_rows(self):
+        """Rows written so far, including ones still buffered."""
+        return self.rows + self._pending_rows
+
+    def write(self, df):
+        if len(df):
+            self._pending.append(df)
+            self._pending_rows += len(df)
+        if self.flush_rows and self._pending_rows >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with PROFILER.stage("write.concat"):
+            if len(self._pending) == 1:
+                df = self._pending[0]
+            elif isinstance(self._pending[0], (GeoColumns, Records)):
+                df = type(self._pending[0]).concat(self._pending)
+            else:
+                df = pd.concat(self._pending, ignore_index=True)
+        self._pending, self._pending_rows = [], 0
+        if isinstance(df, (GeoColumns, Records)) and not self.native_columns:
+            with PROFILER.stage("write.to_frame"):
+                df = df.to_frame()
+        with PROFILER.stage(f"write.{type(self).__name__}"):
+            self._write_frame(df)
+        self.rows += len(df)
+
+    def _write_frame(self, df):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CsvStreamWriter(StreamWriter):
+    """
+    One CSV file, formatted without pandas: GeoColumns and Records are turned into text
+    straight from their arrays / tuples (floats as repr, times as ISO "YYYY-MM-DDTHH:MM:SS").
+    DataFrames from other callers are converted to Records first.
+    With time_index, rows must arrive in time order, and a sparse index
+    <name>_time_index.csv (hour, byte_offset, rows) is written next to the file on close.
+    """
+    suffix = ".csv"
+    native_columns = True
+
+    def __init__(self, path, columns, flush_rows=None, time_index=False):
+        super().__init__(path, columns, flush_rows)
+        self._fh = open(path, "wb")
+        self._index = {} if time_index else None
+        self._write_text(_csv_line(columns))
+
+    def _write_text(self, text):
+        data = text.encode("utf-8")
+        self._fh.write(data)
+        return len(data)
+
+    def _lines(self, df):
+        """Row lines of a batch, plus the hour key ("YYYY-MM-DDTHH") of each row when indexing."""
+        if isinstance(df, GeoColumns):
+            return _geo_csv_lines(df, self.columns), self._index is not None and _hour_keys(df.ts)
+        if not isinstance(df, Records):
+            df = _frame_records(df, self.TIME_COLUMNS)
+        cols = [df.columns.index(c) if c in df.columns else None for c in self.columns]
+        lists = [i for i, c in enumerate(df.columns) if c in self.LIST_COLUMNS]
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        for row in df.rows:
+            if lists:
+                row = list(row)
+                for i in lists:
+                    row[i] = " ".join(map(str, row[i].tolist()))
+            writer.writerow([df.store_id if i is None else row[i] for i in cols])
+        hours = self._index is not None and [str(t)[:13] for t in df.column(self.time_column)]
+        return out.getvalue().splitlines(keepends=True), hours
+
+    def _write_frame(self, df):
+        lines, hours = self._lines(df)
+        if self._index is None:
+            self._write_text("".join(lines))
+        else:
+            start = 0
+            for i in range(1, len(lines) + 1):
+                if i == len(lines) or hours[i] != hours[start]:
+                    entry = self._index.setdefault(hours[start], [self._fh.tell(), 0])
+                    entry[1] += i - start
+                    self._write_text("".join(lines[start:i]))
+                    start = i
+        self._fh.flush()
+
+    @staticmethod
+    def index_path(path):
+        return os.path.splitext(path)[0] + "_time_index.csv"
+
+    def close(self):
+        super().close()
+        self._fh.close()
+        if self._index is not None:
+            with open(self.index_path(self.path), "w", encoding="utf-8", newline="") as fh:
+                fh.write("hour,byte_offset,rows\n")
+                fh.writelines(f"{h},{off},{n}\n" for h, (off, n) in self._index.items())
+
+def _csv_line(fields):
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerow(fields)
+    return out.getvalue()
+
+def _hour_keys(ts):
+    return np.datetime_as_string(ts.astype("datetime64[s]").astype("datetime64[h]"), unit="h").tolist()
+
+def _geo_csv_lines(geo, columns):
+    """CSV lines for GeoColumns; each name present is quoted once, not per row (nor per table entry)."""
+    def quoted(codes, names):
+        used, inverse = np.unique(codes, return_inverse=True)
+        return np.array([_csv_line([names[i]])[:-1] for i in used.tolist()], dtype=object)[inverse.ravel()].tolist()
+    text = {
+        "device_id": quoted(geo.device, geo.tables[0]),
+        "lat": list(map(repr, geo.lat.tolist())),
+        "lon": list(map(repr, geo.lon.tolist())),
+        "timestamp": np.datetime_as_string(geo.ts.astype("datetime64[s]"), unit="s").tolist(),
+        "accuracy_m": list(map(repr, geo.accuracy.tolist())),
+        "role": quoted(geo.role, geo.tables[1]),
+        "area": quoted(geo.area, geo.tables[2]),
+    }
+    if "store_id" in columns:
+        text["store_id"] = [_csv_line([geo.store_id])[:-1]] * len(geo)
+    return [",".join(fields) + "\n" for fields in zip(*(text[c] for c in columns))]
+
+def _frame_records(df, time_columns):
+    """Records from a DataFrame, with datetime columns as ISO text."""
+    for c in time_columns:
+        if c in df and pd.api.types.is_datetime64_dtype(df[c]):
+            df = df.assign(**{c: np.datetime_as_string(df[c].to_numpy(), unit="s")})
+    return Records(df.columns, df.itertuples(index=False, name=None))
+
+def read_time_window(path, start, end, columns=None):
+    """
+    Rows of a time-ordered CSV written with a time index whose timestamp is in [start, end).
+    Only the bytes of the hours overlapping the window are read.
+    """
+    index = pd.read_csv(CsvStreamWriter.index_path(path))
+    hours = index["hour"].to_numpy(dtype="datetime64[h]")
+    start, end = np.datetime64(start, "s"), np.datetime64(end, "s")
+    first = np.searchsorted(hours, start.astype("datetime64[h]"))
+    last = np.searchsorted(hours, end, side="left")
+    if columns is None:
+        columns = pd.read_csv(path, nrows=0).columns
+    if first >= last:
+        return pd.DataFrame(columns=columns)
+    lo = int(index["byte_offset"].iloc[first])
+    hi = int(index["byte_offset"].iloc[last]) if last < len(index) else None
+    with open(path, "rb") as fh:
+        fh.seek(lo)
+        data = fh.read() if hi is None else fh.read(hi - lo)
+    df = pd.read_csv(io.BytesIO(data), names=columns, header=None)
+    ts = pd.to_datetime(df["timestamp"])
+    return df[(ts >= start) & (ts < end)].reset_index(drop=True)
+
+class ParquetStreamWriter(StreamWriter):
+    """
+    Parquet dataset partitioned by day: <path>/date=YYYY-MM-DD/part-NNNNN.parquet.
+    String columns are dictionary-encoded, timestamps are native (stored as timestamp[ms]).
+    Needs pyarrow.
+    """
+    DICT_COLUMNS = {"device_id", "role", "area", "areas", "customer_id", "payment_method"}
+
+    def __init__(self, path, columns, flush_rows=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise ImportError("--format parquet needs pyarrow (pip install pyarrow)") from exc
+        super().__init__(path, columns, flush_rows)
+        self._pa, self._pq = pa, pq
+        self._parts = {}
+        if os.path.isdir(path):
+            shutil.rmtree(path)  # replace a previous run, like the CSV writer does
+        os.makedirs(path)
+
+    def _write_frame(self, df):
+        pa = self._pa
+        ts = pd.to_datetime(df[self.time_column]).to_numpy().astype("datetime64[s]")
+        fields = []
+        for col in self.columns:
+            if col in self.TIME_COLUMNS:
+                fields.append(pa.array(pd.to_datetime(df[col]).to_numpy().astype("datetime64[s]"), type=pa.timestamp("s")))
+            elif col in self.DICT_COLUMNS:
+                fields.append(pa.array(df[col].astype(str).to_numpy(dtype=object)).dictionary_encode())
+            elif col in self.LIST_COLUMNS:
+                fields.append(pa.array(list(df[col]), type=pa.list_(pa.int64())))
+            else:
+                fields.append(pa.array(df[col].to_numpy()))
+        table = pa.Table.from_arrays(fields, names=self.columns)
+        days = ts.astype("datetime64[D]")
+        for day in np.unique(days):
+            part = self._parts.get(day, 0)
+            self._parts[day] = part + 1
+            part_dir = os.path.join(self.path, f"date={day}")
+            os.makedirs(part_dir, exist_ok=True)
+            rows = np.flatnonzero(days == day)
+            self._pq.write_table(table.take(rows), os.path.join(part_dir, f"part-{part:05d}.parquet"))
+
+class BinaryStreamWriter(StreamWriter):
+    """
+    Fixed-width binary dataset: <path>/ holds one raw little-endian file per column plus header.json.
+      times      <i8 epoch seconds
+      floats     <f8, integers <i8
+      strings    <i4 codes into header["tables"][column] (role, area, device_id, customer_id, ...)
+      geo_rows   <i8 values + <i8 offsets (row i is values[offsets[i]:offsets[i+1]])
+    GeoColumns are appended as they are, without going through pandas.
+    Read it back with open_binary(); the header is written on close.
+    """
+    suffix = ".bin"
+    native_columns = True
+    FORMAT_VERSION = 2
+
+    def __init__(self, path, columns, flush_rows=None):
+        super().__init__(path, columns, flush_rows)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        self._files = {}
+        self._dtypes = {}
+        self._tables = {}  # column -> {name: code}
+        self._constants = {}
+        self._list_len = {c: 0 for c in columns if c in self.LIST_COLUMNS}
+
+    def _append(self, name, array, dtype):
+        array = np.ascontiguousarray(array, dtype=dtype)
+        if name not in self._files:
+            self._files[name] = open(os.path.join(self.path, name + ".bin"), "wb")
+            self._dtypes[name] = np.dtype(dtype).str
+        self._files[name].write(array.tobytes())
+
+    def _codes(self, col, codes, names):
+        """Map per-batch codes into the column's append-only table (only the names the batch uses)."""
+        table = self._tables.setdefault(col, {})
+        used, inverse = np.unique(codes, return_inverse=True)
+        remap = np.array([table.setdefault(str(names[i]), len(table)) for i in used.tolist()], dtype=np.int32)
+        return remap[inverse.ravel()]
+
+    def _write_frame(self, df):
+        if isinstance(df, Records):
+            df = df.to_frame()
+        if isinstance(df, GeoColumns):
+            if df.store_id is not None:
+                self._constants["store_id"] = df.store_id
+            devices, roles, areas = df.tables
+            arrays = {"device_id": self._codes("device_id", df.device, devices), "lat": df.lat, "lon": df.lon,
+                      "timestamp": df.ts, "accuracy_m": df.accuracy, "role": self._codes("role", df.role, roles),
+                      "area": self._codes("area", df.area, areas)}
+            for col in self.columns:
+                if col in arrays:
+                    self._append(col, arrays[col], arrays[col].dtype.newbyteorder("<"))
+            return
+        for col in self.columns:
+            values = df[col]
+            if col in self.TIME_COLUMNS:
+                secs = pd.to_datetime(values).to_numpy().astype("datetime64[s]").astype(np.int64)
+                self._append(col, secs, "<i8")
+            elif col in self.LIST_COLUMNS:
+                lengths = np.fromiter((len(v) for v in values), dtype=np.int64, count=len(values))
+                ends = self._list_len[col] + np.cumsum(lengths)
+                if col + ".offsets" not in self._files:
+                    self._append(col + ".offsets", [0], "<i8")
+                self._append(col + ".offsets", ends, "<i8")
+                self._append(col, np.concatenate(list(values)) if len(values) else [], "<i8")
+                self._list_len[col] = int(ends[-1]) if len(ends) else self._list_len[col]
+            elif isinstance(values.dtype, pd.CategoricalDtype):
+                self._append(col, self._codes(col, values.cat.codes.to_numpy(), values.cat.categories), "<i4")
+            elif pd.api.types.is_float_dtype(values):
+                self._append(col, values.to_numpy(), "<f8")
+            elif pd.api.types.is_integer_dtype(values):
+                self._append(col, values.to_numpy(), "<i8")
+            else:
+                codes, names = pd.factorize(values.astype(str))
+                self._append(col, self._codes(col, codes, names), "<i4")
+
+    def close(self):
+        super().close()
+        for fh in self._files.values():
+            fh.close()
+        header = {
+            "format": "kupa-binary", "version": self.FORMAT_VERSION, "rows": self.rows,
+            "order": [c for c in self.columns if c in self._dtypes],
+            "columns": {c: self._dtypes.get(c) for c in self.columns if c in self._dtypes and c not in self._list_len},
+            "lists": {c: self._dtypes.get(c) for c in self._list_len if c in self._dtypes},
+            "times": [c for c in self.columns if c in self.TIME_COLUMNS],
+            "tables": {c: list(t) for c, t in self._tables.items()},
+            "constants": self._constants,
+        }
+        with open(os.path.join(self.path, "header.json"), "w", encoding="utf-8") as fh:
+            json.dump(header, fh)
+
+class BinaryDataset:
+    """
+    Read-only view of a BinaryStreamWriter directory. Every column is a numpy.memmap
+    (opened lazily, nothing parsed or copied), so opening is instant and processes
+    that map the same files share the page cache.
+      ds["lat"]                raw column (codes for string columns, epoch seconds for times)
+      ds.times("timestamp")    datetime64[s] view of a time column
+      ds.decode("role", rows)  names for (a slice of) a coded column
+      ds.list("geo_rows", i)   the ints of list column row i
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "header.json"), encoding="utf-8") as fh:
+            self.header = json.load(fh)
+        self.rows = self.header["rows"]
+        self.tables = {c: np.array(t, dtype=object) for c, t in self.header["tables"].items()}
+        self.constants = self.header["constants"]
+        self._maps = {}
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def columns(self):
+        """All columns in write order, list columns included."""
+        return list(self.header["order"])
+
+    def _map(self, name, dtype, length=None):
+        if name not in self._maps:
+            length = self.rows if length is None else length
+            if length == 0:
+                self._maps[name] = np.empty(0, dtype=dtype)
+            else:
+                self._maps[name] = np.memmap(os.path.join(self.path, name + ".bin"), dtype=dtype, mode="r",
+                                             shape=(length,))
+        return self._maps[name]
+
+    def __getitem__(self, col):
+        if col in self.header["lists"]:
+            raise KeyError(f"{col!r} is a list column; read it with list({col!r}, i)")
+        return self._map(col, self.header["columns"][col])
+
+    def times(self, col="timestamp"):
+        return self[col].view("datetime64[s]")
+
+    def decode(self, col, rows=slice(None)):
+        return self.tables[col][self[col][rows]]
+
+    def list(self, col, i):
+        offsets = self._map(col + ".offsets", "<i8", self.rows + 1 if self.rows else 0)
+        values = self._map(col, self.header["lists"][col], int(offsets[-1]) if self.rows else 0)
+        return values[offsets[i]:offsets[i + 1]]
+
+    def to_frame(self, rows=slice(None)):
+        """Materialize (a slice of) the dataset as a DataFrame; this one does copy."""
+        df = pd.DataFrame({c: [np.array(self.list(c, i)) for i in range(self.rows)[rows]] if c in self.header["lists"] else
+                           self.decode(c, rows) if c in self.tables else
+                           self.times(c)[rows] if c in self.header["times"] else np.asarray(self[c][rows])
+                           for c in self.columns})
+        for c, v in self.constants.items():
+            df.insert(0, c, v)
+        return df
+
+def open_binary(path):
+    return BinaryDataset(path)
+
+OUTPUT_FORMATS = {"csv": CsvStreamWriter, "parquet": ParquetStreamWriter, "binary": BinaryStreamWriter}
+
+def day_rngs(d, seed=SEED):
+    """
+    Independent RNG streams for one day, derived from the master seed and the date.
+    Returns (random.Random, numpy Generator); a day's output depends only on these,
+    so days can be generated in any order or in parallel.
+    """
+    seq = np.random.SeedSequence([seed, d.toordinal()])
+    py_seed, np_seed = seq.spawn(2)
+    return random.Random(int(py_seed.generate_state(1)[0])), np.random.default_rng(np_seed)
+
+def pick_ids(role, k, rng=random, d=None, seed=SEED):
+    """k distinct ids of role; given a date, only people not on leave that day."""
+    pool = id_pools()[role] if d is None else available_ids(role, d, seed)
+    k = min(k, len(pool))
+    return rng.sample(pool, k)
+
+def sample_ids(role, k, rng):
+    """pick_ids for a numpy Generator."""
+    pool = id_pools()[role]
+    return [pool[i] for i in rng.choice(len(pool), min(k, len(pool)), replace=False)]
+
+def open_days(start_date, end_date):
+    """Open dates in start..end; also installs the range's Calendar for the planners."""
+    cal = Calendar(start_date, end_date)
+    use_calendar(cal)
+    return cal.open_dates()
+
+def daily_count(lo, hi, special, rng):
+    """Visitors of one kind today: lo..hi, +30% on special days, scaled by TRAFFIC_SCALE (numpy Generator)."""
+    n = int(rng.integers(lo, hi + 1))
+    if special: n = int(math.ceil(n * 1.3))
+    return int(math.ceil(n * TRAFFIC_SCALE))
+
+@profiled
+def plan_day(d, repeat_ids=None, rng=random, seed=SEED):
+    """
+    Plan one open day without emitting any points.
+    Returns (segments, sales): segments are (device_id, role, area, start, end) tuples,
+    sales are build_sale dicts. Workers on leave (staff_on) are not scheduled;
+    repeat_ids=None draws from the whole repeat_customer pool.
+    """
+    cal = get_calendar(d)
+    i = cal.index(d)
+    special = bool(cal.special[i])
+
+    day_segs = []  # (device_id, role, area, start, end)
+    sales = []
+
+    # Workers
+    managers = available_ids("manager", d, seed)  # the first one present; the replacement otherwise
+    for area, s, e in manager_shift(d, rng):
+        if managers:
+            day_segs.append((managers[0], "manager", area, s, e))
+
+    cashier_windows = cashier_shifts(d, rng)
+    for cid, (area, s, e) in zip(pick_ids("cashier", len(cashier_windows), rng, d, seed), cashier_windows):
+        day_segs.append((cid, "cashier", area, s, e))
+
+    butch_windows = butchery_shifts(d)
+    for bid, (area, s, e) in zip(pick_ids("butcher", len(butch_windows), rng, d, seed), butch_windows):
+        day_segs.append((bid, "butcher", area, s, e))
+
+    for (area, s, e) in delivery_shifts(d, rng):
+        for did in pick_ids("delivery_guy", int(cal.staff["delivery_guy"][i]), rng, d, seed):
+            day_segs.append((did, "delivery_guy", area, s, e))
+
+    for (area, s, e) in general_worker_shifts(d):
+        for gid in pick_ids("general_worker", int(cal.staff["general_worker"][i]), rng, d, seed):
+            day_segs.append((gid, "general_worker", area, s, e))
+
+    for (area, s, e) in senior_general_shift(d):
+        day_segs.append((id_pools()["senior_general_worker"][0], "senior_general_worker", area, s, e))
+
+    guards = available_ids("security_guy", d, seed)
+    for (area, s, e) in security_shift(d):
+        if guards:
+            day_segs.append((rng.choice(guards), "security_guy", area, s, e))
+
+    # Customers: drawn together by the vectorized planner from a stream seeded off the day's rng.
+    # Every draw is O(visitors today), not O(population): how many repeat customers come is
+    # binomial, which ones is a sample without replacement.
+    plan_rng = np.random.default_rng(rng.getrandbits(64))
+    if repeat_ids is None:
+        repeat_ids = id_pools()["repeat_customer"]
+    coming = plan_rng.binomial(len(repeat_ids), cal.repeat_prob[i])
+    todays_repeat = [repeat_ids[j] for j in plan_rng.choice(len(repeat_ids), coming, replace=False)]
+    cust_ids, roles = list(todays_repeat), [ROLE_CODES["repeat_customer"]] * len(todays_repeat)
+    for role, (lo, hi) in CUSTOMER_COUNTS.items():
+        ids = sample_ids(role, daily_count(lo, hi, special, plan_rng), plan_rng)
+        cust_ids += ids
+        roles += [ROLE_CODES[role]] * len(ids)
+    roles = np.array(roles, dtype=np.int64)
+    arrive, park_end, roam_end, pay_end = plan_customers(cal, np.full(len(roles), i), roles, plan_rng)
+
+    role_names = list(ROLE_CODES)
+    midnight = datetime.combine(d, time())
+    no_phone = ROLE_CODES["no_phone"]
+    buyers, paid_at = [], []
+    for cust_id, code, a, p, r, q in zip(cust_ids, roles.tolist(), arrive.tolist(), park_end.tolist(),
+                                         roam_end.tolist(), pay_end.tolist()):
+        if code == no_phone:
+            continue  # not tracked, and never reach a tracked register
+        role = role_names[code]
+        a, p, r, q = (midnight + MINUTE_DELTAS[m] for m in (a, p, r, q))
+        if p > a:
+            day_segs.append((cust_id, role, "PARKING", a, p))
+        if r > p:
+            day_segs.append((cust_id, role, "SUPERMARKET", p, r))
+        if q > r:
+            day_segs.append((cust_id, role, "CASH_REGISTERS", r, q))
+            buyers.append(cust_id)
+            paid_at.append(q)
+    paying = pay_end > roam_end
+    sales += build_sales(buyers, paid_at, (pay_end - park_end)[paying & (roles != no_phone)], plan_rng)
+
+    return day_segs, sales
+
+@profiled
+def generate_day(d, repeat_ids, seed=SEED, raw=True, interval=SAMPLE_SECONDS):
+    """
+    Simulate one open day; returns (geo, sales, visits, summaries), each ordered by time.
+    summaries is summarize_day's (occupancy, footfall, revenue). With raw=False no points
+    are emitted and geo / visits are None; the summaries don't depend on them.
+    """
+    rng, np_rng = day_rngs(d, seed)
+    day_segs, sales = plan_day(d, repeat_ids, rng, seed)
+    sales.sort(key=lambda sale: sale["timestamp"])
+    sales_rows = Records(SALES_COLUMNS, [tuple(sale[c] for c in SALES_COLUMNS) for sale in sales])
+    summaries = summarize_day(d, day_segs, sales)
+    if not raw:
+        return None, sales_rows, None, summaries
+    geo, seg_idx = _emit_sorted(day_segs, 0.4, np_rng, interval)
+    return geo, sales_rows, build_visits(d, day_segs, sales, seg_idx), summaries
+
+VISIT_COLUMNS = ["visit_id", "device_id", "role", "arrival", "leave", "dwell_minutes", "areas", "area_spans",
+                 "sale_id", "n_fixes", "geo_rows"]
+
+@profiled
+def build_visits(d, segments, sales, seg_idx):
+    """
+    Ground truth for one day: one row per device with its segments merged into a visit.
+    areas / area_spans list the segments in order ("PARKING|SUPERMARKET", "10:07-10:12|10:12-10:58"),
+    sale_id links the customer's sale (empty if none), n_fixes counts its geolocation rows.
+    geo_rows holds the positions of those rows in the day's geolocation output as an int array;
+    generate_data rebases them to row numbers of the written file (see visit_geo_rows).
+    """
+    by_device = {}
+    for i, seg in enumerate(segments):
+        by_device.setdefault(seg[0], []).append(i)
+    rows_by_seg = np.split(np.argsort(seg_idx, kind="stable"), np.cumsum(np.bincount(seg_idx, minlength=len(segments)))[:-1])
+    sale_of = {sale["customer_id"]: sale["sale_id"] for sale in sales}
+    visits = []
+    for device_id, idx in by_device.items():
+        segs = sorted((segments[i] for i in idx), key=lambda seg: seg[3])
+        arrival = min(seg[3] for seg in segs)
+        leave = max(seg[4] for seg in segs)
+        rows = np.sort(np.concatenate([rows_by_seg[i] for i in idx]))
+        visits.append((
+            f"{d:%Y%m%d}-{device_id}", device_id, segs[0][1], arrival.isoformat(), leave.isoformat(),
+            (leave - arrival) // MINUTE,
+            "|".join(seg[2] for seg in segs),
+            "|".join(f"{s.hour:02d}:{s.minute:02d}-{e.hour:02d}:{e.minute:02d}" for _, _, _, s, e in segs),
+            sale_of.get(device_id, ""), len(rows), rows,
+        ))
+    visits.sort(key=lambda v: v[3])
+    return Records(VISIT_COLUMNS, visits)
+
+def visit_geo_rows(visits, base):
+    """Rebase build_visits' day-local geo_rows to row numbers of the written file (0 = first data row)."""
+    return Records(visits.columns, [v[:-1] + (v[-1] + base,) for v in visits.rows], visits.store_id)
+
+# -------------------------
+# Summary tables
+# -------------------------
+FOOTFALL_COLUMNS = ["timestamp", "role", "visitors"]
+REVENUE_COLUMNS = ["timestamp", "sales", "subtotal", "tax", "revenue"]
+SUMMARY_OUTPUTS = ("occupancy", "footfall", "revenue")
+
+def occupancy_columns():
+    return ["timestamp"] + list(AREAS)
+
+@profiled
+def summarize_day(d, segments, sales):
+    """
+    Aggregates of one day computed from the planned segments and sales, not from emitted rows:
+      occupancy  per minute, devices present in each area (segment ends are inclusive, like emission);
+                 only minutes from the first arrival to the last departure
+      footfall   per hour and role, devices whose first segment starts in that hour
+      revenue    per hour, number of sales and summed subtotal / tax / total
+    Returns three Records (OCCUPANCY / FOOTFALL / REVENUE columns).
+    """
+    midnight = datetime.combine(d, time())
+    occupancy = Records(occupancy_columns())
+    if segments:
+        area = np.array([AREA_CODES[seg[2]] for seg in segments])
+        start = np.array([(seg[3] - midnight) // MINUTE for seg in segments])
+        end = np.array([(seg[4] - midnight) // MINUTE for seg in segments])
+        diff = np.zeros((len(AREA_CODES), 24 * 60 + 2), dtype=np.int32)
+        np.add.at(diff, (area, start), 1)
+        np.add.at(diff, (area, end + 1), -1)
+        lo, hi = int(start.min()), int(end.max())
+        present = np.cumsum(diff, axis=1)[:, lo:hi + 1]
+        stamps = np.datetime_as_string(np.datetime64(midnight, "m") + np.arange(lo, hi + 1), unit="s").tolist()
+        occupancy.rows = list(zip(stamps, *present.tolist()))
+
+    first = {}
+    for device_id, role, _, s, _ in segments:
+        if device_id not in first or s < first[device_id][1]:
+            first[device_id] = (role, s)
+    visitors = {}
+    for role, s in first.values():
+        key = (s.replace(minute=0, second=0).isoformat(), ROLE_CODES[role])
+        visitors[key] = visitors.get(key, 0) + 1
+    roles = list(ROLE_CODES)
+    footfall = Records(FOOTFALL_COLUMNS, [(h, roles[r], n) for (h, r), n in sorted(visitors.items())])
+
+    hours = {}
+    for sale in sales:
+        acc = hours.setdefault(sale["timestamp"][:13] + ":00:00", [0, 0.0, 0.0, 0.0])
+        acc[0] += 1
+        acc[1] += sale["subtotal"]
+        acc[2] += sale["tax"]
+        acc[3] += sale["total"]
+    revenue = Records(REVENUE_COLUMNS, [(h, n, round(st, 2), round(tx, 2), round(tt, 2))
+                                        for h, (n, st, tx, tt) in sorted(hours.items())])
+    return occupancy, footfall, revenue
+
+# -------------------------
+# Multi-store (chain) mode
+# -------------------------
+class StoreConfig:
+    """
+    One store of a chain. Anything left as None falls back to the module defaults.
+      areas          {area: polygon} overriding AREAS polygons (same area names)
+      opening_rules  {weekday: (open time, close time)} replacing OPENING_RULES
+      role_scale     multiplies ROLE_CONFIG counts and the daily customer traffic
+    """
+    def __init__(self, store_id, areas=None, opening_rules=None, role_scale=1.0, holidays=None, special_days=None):
+        self.store_id = str(store_id)
+        self.areas = areas or {}
+        self.opening_rules = opening_rules
+        self.role_scale = float(role_scale)
+        self.holidays = holidays
+        self.special_days = special_days
+        unknown = set(self.areas) - set(AREAS)
+        if unknown:
+            raise ValueError(f"store {self.store_id}: unknown areas {sorted(unknown)} (expected {sorted(AREAS)})")
+
+    @classmethod
+    def from_dict(cls, cfg):
+        """Build from JSON-style values: polygons as [[lat, lon], ...], hours as {"6": ["07:30", "21:00"]}, ISO dates."""
+        def dates(xs):
+            return None if xs is None else {datetime.fromisoformat(x).date() for x in xs}
+        rules = cfg.get("opening_rules")
+        if rules is not None:
+            rules = {int(wd): (time.fromisoformat(o), time.fromisoformat(c)) for wd, (o, c) in rules.items()}
+        areas = {a: [tuple(p) for p in poly] for a, poly in cfg.get("areas", {}).items()}
+        return cls(cfg["store_id"], areas=areas, opening_rules=rules, role_scale=cfg.get("role_scale", 1.0),
+                   holidays=dates(cfg.get("holidays")), special_days=dates(cfg.get("special_days")))
+
+    def seed(self, master_seed):
+        """This store's master seed, derived from the chain seed and the store id."""
+        return int(np.random.SeedSequence([master_seed, zlib.crc32(self.store_id.encode())]).generate_state(1)[0])
+
+    def key(self):
+        return repr(sorted(vars(self).items()))
+
+def load_stores(path):
+    """Read a JSON list of store definitions (see StoreConfig.from_dict)."""
+    with open(path, encoding="utf-8") as fh:
+        cfg = json.load(fh)
+    stores = [StoreConfig.from_dict(c) for c in (cfg["stores"] if isinstance(cfg, dict) else cfg)]
+    ids = [s.store_id for s in stores]
+    if len(set(ids)) != len(ids):
+        raise ValueError("store_id values must be unique")
+    return stores
+
+def config_snapshot():
+    """
+    The module-level config as it is now, for apply_store. Chain runs take one when they
+    start, so edits made to ROLE_CONFIG, AREAS, ... before the run are what stores scale
+    from, and they are what the run puts back at the end.
+    """
+    base = {
+        "areas": dict(AREAS),
+        "opening_rules": dict(OPENING_RULES),
+        "holidays": set(HOLIDAYS),
+        "special_days": set(SPECIAL_DAYS),
+        "counts": {r: cfg["count"] for r, cfg in ROLE_CONFIG.items()},
+        "traffic_scale": TRAFFIC_SCALE,
+    }
+    base["key"] = repr([sorted(v.items()) if isinstance(v, dict) else sorted(v) if isinstance(v, set) else v
+                        for v in base.values()])
+    return base
+
+_APPLIED_STORE = None  # (store key, base key) currently applied
+
+def apply_store(store, base):
+    """
+    Point the module-level config at one store, derived from `base` (a config_snapshot);
+    store=None puts base itself back. Generation reads AREAS, OPENING_RULES, ROLE_CONFIG, ...
+    as globals, so a process simulates one store at a time; ID pools are rebuilt per store
+    and never shared.
+    """
+    global AREAS, AREA_SAMPLERS, _AREA_INDEX, OPENING_RULES, HOLIDAYS, SPECIAL_DAYS, TRAFFIC_SCALE, _APPLIED_STORE
+    key = (store.key() if store else None, base["key"])
+    if key == _APPLIED_STORE:
+        return
+    scale = store.role_scale if store else 1.0
+    store = store or StoreConfig("default")
+    AREAS = {a: store.areas.get(a, poly) for a, poly in base["areas"].items()}
+    AREA_SAMPLERS = {a: polygon_sampler(p) for a, p in AREAS.items()}
+    _AREA_INDEX = None
+    use_calendar(None)
+    OPENING_RULES = dict(store.opening_rules) if store.opening_rules is not None else dict(base["opening_rules"])
+    HOLIDAYS = set(store.holidays) if store.holidays is not None else set(base["holidays"])
+    SPECIAL_DAYS = set(store.special_days) if store.special_days is not None else set(base["special_days"])
+    TRAFFIC_SCALE = base["traffic_scale"] * scale
+    for role, count in base["counts"].items():
+        ROLE_CONFIG[role]["count"] = max(1, round(count * scale)) if scale != 1.0 else count
+    rebuild_id_pools()
+    _APPLIED_STORE = key
+
+# -------------------------
+# Per-day partition cache
+# -------------------------
+CACHE_VERSION = 10  # bump when generate_day's logic changes
+
+def day_cache_key(d, seed=SEED, raw=True, interval=SAMPLE_SECONDS):
+    """Hash of everything one day's output depends on: date, seed, config and the day's calendar flags."""
+    cfg = (CACHE_VERSION, d.isoformat(), seed, sorted(OPENING_RULES.items()), ROLE_CONFIG, LEAVE_RULES, AREAS,
+           TRAFFIC_SCALE, CUSTOMER_COUNTS, ARRIVAL_HOURS, d in HOLIDAYS, d in SPECIAL_DAYS, raw, interval, WALK_FRACTION, GPS_SIGMA,
+           NOISE_TRIES)
+    return hashlib.sha256(repr(cfg).encode()).hexdigest()[:16]
+
+def cached_generate_day(d, repeat_ids, seed, cache_dir, raw=True, interval=SAMPLE_SECONDS):
+    """
+    generate_day through an on-disk cache of day partitions (<cache_dir>/<date>-<key>.pkl).
+    A day is regenerated only when its key changed; partitions are written atomically,
+    so an interrupted run resumes from the days already cached.
+    """
+    key = day_cache_key(d, seed, raw, interval)
+    path = os.path.join(cache_dir, f"{d.isoformat()}-{key}.pkl")
+    if os.path.exists(path):
+        with PROFILER.stage("cache.load"), open(path, "rb") as fh:
+            return pickle.load(fh)
+    result = generate_day(d, repeat_ids, seed, raw, interval)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    for stale in glob.glob(os.path.join(cache_dir, f"{d.isoformat()}-*.pkl")):
+        if stale != path:
+            os.remove(stale)
+    return result
+
+def _generate_day_task(args):
+    store, base, d, repeat_ids, seed, cache_dir, profile_child, raw, interval = args
+    if store:
+        apply_store(store, base)
+    if profile_child:
+        PROFILER.enabled = True
+    if cache_dir:
+        result = cached_generate_day(d, repeat_ids, seed, cache_dir, raw, interval)
+    else:
+        result = generate_day(d, repeat_ids, seed, raw, interval)
+    if profile_child:
+        return result, PROFILER.pop_snapshot()
+    return result
+
+def _imap_ordered(pool, fn, items, window):
+    """Like pool.map, but keeps at most `window` tasks in flight so results don't pile up."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def generate_data(start_date, end_date, out_dir, flush_rows=None, workers=1, seed=SEED, fmt="csv", cache_dir=None,
+                  profile=False, stores=None, time_index=False, raw=True, interval=SAMPLE_SECONDS):
+    """
+    Simulate start_date..end_date and stream the rows to out_dir.
+    Rows come out in timestamp order: days are produced in order and each day is
+    merged across devices (emit_points_for_segments), so no sort pass is needed afterwards.
+    Output is flushed at the end of every day, or every flush_rows rows if given,
+    so peak memory does not grow with the length of the range.
+    With workers > 1 days are generated in a process pool; every day has its own
+    RNG stream derived from seed, so the files are byte-identical for any workers.
+    fmt picks the writer from OUTPUT_FORMATS ("csv", "parquet" or "binary").
+    With cache_dir, days are reused from / stored to the partition cache (see cached_generate_day).
+    With profile, per-stage timings and row counters are printed and saved to <out_dir>/profile.json.
+    With stores (list of StoreConfig), each store is simulated with its own config, population
+    and seed, and written to its own shard <out_dir>/<store_id>/ with a leading store_id column;
+    the pool works through all stores' days together.
+    With time_index (csv only), geolocation also gets an hourly byte-offset index (see read_time_window).
+    The summary tables occupancy / footfall / revenue (summarize_day) are always written;
+    raw=False skips emission and the geolocation / log_sales / visits outputs.
+    interval is the sampling interval in seconds: each device is detected with probability 0.4 once per interval.
+    """
     # Ensure output dir exists
     os.makedirs(out_dir, exist_ok=True)
 
-    georows, sales = [], []
+    PROFILER.enabled = profile
+    profile_child = profile and workers > 1
+    base = config_snapshot() if stores else None
+    tasks = []
+    for store in stores or [None]:
+        store_seed = seed
+        store_cache = cache_dir
+        if store:
+            apply_store(store, base)
+            store_seed = store.seed(seed)
+            store_cache = cache_dir and os.path.join(cache_dir, store.store_id)
+        if store_cache:
+            os.makedirs(store_cache, exist_ok=True)
+        tasks += [(store, base, d, None, store_seed, store_cache, profile_child, raw, interval)
+                  for d in open_days(start_date, end_date)]
+
+    writer = OUTPUT_FORMATS[fmt]
+    geo_columns, sales_columns, visit_columns = (
+        [["store_id"] + cols for cols in (GEO_COLUMNS, SALES_COLUMNS, VISIT_COLUMNS)] if stores
+        else (GEO_COLUMNS, SALES_COLUMNS, VISIT_COLUMNS))
+    outputs = []  # (store, geo / sales / visits writers or None, summary writers), current shard last
+
+    def open_shard(store):
+        shard_dir = os.path.join(out_dir, store.store_id) if store else out_dir
+        os.makedirs(shard_dir, exist_ok=True)
+        path = lambda name: os.path.join(shard_dir, name + writer.suffix)
+        prefix = ["store_id"] if store else []
+        raw_outs = (None, None, None)
+        if raw:
+            raw_outs = (writer(path("geolocation"), geo_columns, flush_rows, **({"time_index": True} if time_index else {})),
+                        writer(path("log_sales"), sales_columns, flush_rows),
+                        writer(path("visits"), visit_columns, flush_rows))
+        summary_outs = tuple(writer(path(name), prefix + cols, flush_rows) for name, cols in
+                             zip(SUMMARY_OUTPUTS, (occupancy_columns(), FOOTFALL_COLUMNS, REVENUE_COLUMNS)))
+        outputs.append((store, *raw_outs, summary_outs))
+
+    def close_shard():
+        _, *raw_outs, summary_outs = outputs[-1]
+        for out in [o for o in raw_outs if o] + list(summary_outs):
+            out.close()
+            print(f"[OK] Wrote {out.rows:,} rows → {out.path}")
+
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor  # deferred: pulls in multiprocessing
+        pool = ProcessPoolExecutor(workers)
+        results = _imap_ordered(pool, _generate_day_task, tasks, window=2 * workers)
+    else:
+        pool = None
+        results = map(_generate_day_task, tasks)
+    try:
+        if not stores:
+            open_shard(None)
+        for (store, *_), result in zip(tasks, results):
+            if store and (not outputs or outputs[-1][0] is not store):
+                if outputs:
+                    close_shard()
+                open_shard(store)
+            _, geo_out, sales_out, visits_out, summary_outs = outputs[-1]
+            if profile_child:
+                result, snap = result
+                PROFILER.merge(snap)
+            geo_df, sales_df, visits_df, summaries = result
+            PROFILER.count("sales", "rows", len(sales_df))
+            for out, table in zip(summary_outs, summaries):
+                table.store_id = store and store.store_id
+                out.write(table)
+            if raw:
+                PROFILER.count_values("rows_by_role", geo_df.counts("role"))
+                PROFILER.count_values("rows_by_area", geo_df.counts("area"))
+                PROFILER.count("visits", "rows", len(visits_df))
+                visits_df = visit_geo_rows(visits_df, geo_out.total_rows)
+                if store:
+                    geo_df.store_id = sales_df.store_id = visits_df.store_id = store.store_id
+                    PROFILER.count("rows_by_store", store.store_id, len(geo_df))
+                geo_out.write(geo_df)
+                sales_out.write(sales_df)
+                visits_out.write(visits_df)
+            if not flush_rows:
+                for out in (geo_out, sales_out, visits_out, *summary_outs):
+                    if out:
+                        out.flush()
+        if outputs:
+            close_shard()
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        if stores:
+            apply_store(None, base)
+
+    if profile:
+        report = PROFILER.report()
+        print_profile(report)
+        profile_path = os.path.join(out_dir, "profile.json")
+        with open(profile_path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"[OK] Wrote profile → {profile_path}")
+
+# -------------------------
+# Real-time streaming
+# -------------------------
+def _segment_events(seg, detect_prob, rng, interval=SAMPLE_SECONDS):
+    """Geolocation events of one segment, drawn when the merge first reaches it."""
+    device_id, role, area, _, _ = seg
+    _, ts, accuracy, lats, lons, _, _ = _emit_arrays([seg], detect_prob, rng, interval)
+    for t, iso, lat, lon, acc in zip(ts.tolist(), np.datetime_as_string(ts.astype("datetime64[s]"), unit="s").tolist(),
+                                     lats.tolist(), lons.tolist(), accuracy.tolist()):
+        yield t, {"type": "geo", "device_id": device_id, "lat": lat, "lon": lon, "timestamp": iso,
+                  "accuracy_m": acc, "role": role, "area": area}
+
+def _merge_day(segments, sales, detect_prob, rng, interval=SAMPLE_SECONDS):
+    """
+    Lazy k-way merge of one day's per-segment streams and sales, in timestamp order.
+    A segment joins the heap only once the merge clock reaches its start, and is dropped
+    when exhausted, so only the currently active segments are held in memory.
+    """
+    pending = sorted(
+        [((s - EPOCH) // timedelta(seconds=1), i, seg) for i, seg in enumerate(segments) for s in [seg[3]]]
+        + [((datetime.fromisoformat(sale["timestamp"]) - EPOCH) // timedelta(seconds=1), len(segments) + i, sale)
+           for i, sale in enumerate(sales)],
+        key=lambda x: x[:2])
+    heap = []
+    nxt = 0
+    while nxt < len(pending) or heap:
+        while nxt < len(pending) and (not heap or pending[nxt][0] <= heap[0][0]):
+            start, order, item = pending[nxt]
+            nxt += 1
+            if isinstance(item, dict):
+                stream = iter([(start, {"type": "sale", **item})])
+            else:
+                stream = _segment_events(item, detect_prob, rng, interval)
+            first = next(stream, None)
+            if first:
+                heapq.heappush(heap, (first[0], order, first[1], stream))
+        if not heap:
+            continue
+        t, order, event, stream = heapq.heappop(heap)
+        yield t, event
+        following = next(stream, None)
+        if following:
+            heapq.heappush(heap, (following[0], order, following[1], stream))
+
+def stream_events(start_date, end_date, seed=SEED, detect_prob=0.4, interval=SAMPLE_SECONDS):
+    """
+    Yield (epoch_seconds, event) for every geolocation fix and sale in start_date..end_date,
+    in global timestamp order. Events are dicts with "type" = "geo" (GEO_COLUMNS) or
+    "sale" (SALES_COLUMNS). Days are planned one at a time and merged lazily (_merge_day).
+    """
+    for d in open_days(start_date, end_date):
+        rng, np_rng = day_rngs(d, seed)
+        segments, sales = plan_day(d, None, rng, seed)
+        yield from _merge_day(segments, sales, detect_prob, np_rng, interval)
+
+@contextlib.contextmanager
+def open_sink(target):
+    """
+    Text sink for the event stream: "-" is stdout, tcp://host:port and unix:///path
+    connect to a listening local socket, anything else is a file opened for appending.
+    """
+    if target == "-":
+        yield sys.stdout
+        return
+    import socket
+    if target.startswith("tcp://"):
+        host, port = target[len("tcp://"):].rsplit(":", 1)
+        sock = socket.create_connection((host, int(port)))
+    elif target.startswith("unix://"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(target[len("unix://"):])
+    else:
+        with open(target, "a", encoding="utf-8", newline="\n") as fh:
+            yield fh
+        return
+    with sock, sock.makefile("w", encoding="utf-8", newline="\n") as fh:
+        yield fh
+
+def run_stream(start_date, end_date, sink="-", speed=None, seed=SEED, interval=SAMPLE_SECONDS):
+    """
+    Write stream_events as JSON lines to sink.
+    speed=None replays as fast as possible; otherwise `speed` simulated seconds pass per
+    wall-clock second (1 = real time, 60 = a minute per second) and lines are flushed as sent.
+    On stdout a reader that goes away (e.g. `| head`) ends the stream quietly.
+    """
+    n, note = 0, ""
+    try:
+        with open_sink(sink) as out:
+            clock0 = sim0 = None
+            for t, event in stream_events(start_date, end_date, seed, interval=interval):
+                if speed:
+                    if clock0 is None:
+                        clock0, sim0 = perf_counter(), t
+                    delay = (t - sim0) / speed - (perf_counter() - clock0)
+                    if delay > 0:
+                        out.flush()
+                        time_module.sleep(delay)
+                out.write(json.dumps(event) + "\n")
+                n += 1
+            out.flush()
+    except BrokenPipeError:
+        if sink != "-":
+            raise
+        # point stdout at devnull so the interpreter's flush at exit does not fail again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        note = " (reader closed the pipe)"
+    print(f"[OK] Streamed {n:,} events → {sink}{note}", file=sys.stderr)
+
+# -------------------------
+# Validation
+# -------------------------
+COORD_EPS = 0.5e-6  # rounding of lat/lon in the outputs
+PRE_OPEN = {"delivery_guy": time(5, 50), "senior_general_worker": time(6, 0)}  # roles seen before opening: earliest time
+
+class Check:
+    """Violation counter of one check: rows checked, rows failing, and the first few failing rows."""
+
+    def __init__(self, samples):
+        self.checked = 0
+        self.violations = 0
+        self.samples = []
+        self.max_samples = samples
+
+    def add(self, df, bad, checked=True):
+        """Count one chunk: df the rows checked, bad a boolean mask of the failing ones."""
+        self.checked += len(df) if checked else 0
+        n = int(np.count_nonzero(bad))
+        self.violations += n
+        if n and len(self.samples) < self.max_samples:
+            rows = df[bad].head(self.max_samples - len(self.samples)).copy()
+            for c in StreamWriter.TIME_COLUMNS:  # read_chunks made them epoch seconds; show them as written
+                if c in rows and rows[c].dtype.kind == "i":
+                    rows[c] = rows[c].to_numpy().astype("datetime64[s]").astype(str)
+            self.samples += json.loads(rows.to_json(orient="records", date_format="iso"))
+
+    def report(self):
+        return {"checked": self.checked, "violations": self.violations, "samples": self.samples}
+
+def read_chunks(path, fmt, chunk_rows, time_columns=StreamWriter.TIME_COLUMNS):
+    """
+    One output of a dataset as DataFrames of at most chunk_rows rows, in file order.
+    Time columns come back as int64 epoch seconds; string columns of csv/binary as categoricals
+    or str. Only one chunk is in memory at a time.
+    """
+    if fmt == "csv":
+        header = pd.read_csv(path, nrows=0).columns
+        dtypes = {c: "category" if c in ("role", "area", "payment_method") else str
+                  for c in header if c not in ("lat", "lon", "accuracy_m", "subtotal", "tax", "total",
+                                               "dwell_minutes", "n_fixes")}
+        for df in pd.read_csv(path, chunksize=chunk_rows, dtype=dtypes, keep_default_na=False):
+            for c in time_columns:
+                if c in df:
+                    df[c] = pd.to_datetime(df[c], format="%Y-%m-%dT%H:%M:%S").to_numpy().astype("datetime64[s]").astype(np.int64)
+            yield df
+    elif fmt == "parquet":
+        import pyarrow.dataset as pads
+        for batch in pads.dataset(path, format="parquet", partitioning="hive").to_batches(batch_size=chunk_rows):
+            df = batch.to_pandas()
+            for c in time_columns:
+                if c in df:
+                    df[c] = df[c].to_numpy().astype("datetime64[s]").astype(np.int64)
+            yield df
+    else:
+        ds = open_binary(path)
+        columns = [c for c in ds.columns if c not in StreamWriter.LIST_COLUMNS]
+        for lo in range(0, len(ds), chunk_rows):
+            rows = slice(lo, lo + chunk_rows)
+            yield pd.DataFrame({c: pd.Categorical.from_codes(ds[c][rows], ds.tables[c]) if c in ds.tables
+                                else np.asarray(ds[c][rows]) for c in columns})
+
+def _hours_check(cal, ts, roles=None):
+    """Mask of timestamps on a closed day or outside opening hours (PRE_OPEN roles may start early)."""
+    day = ts // 86400
+    i = day - cal.days[0].astype(np.int64)
+    closed = cal.closed[i]
+    second = ts - day * 86400
+    open_s = cal.open_min[i].astype(np.int64) * 60
+    if roles is not None:
+        for role, t in PRE_OPEN.items():
+            open_s = np.where(roles == role, np.minimum(open_s, _minutes(t) * 60), open_s)
+    return closed, ~closed & ((second < open_s) | (second > cal.close_min[i].astype(np.int64) * 60))
 
-    def pick_ids(role, k):
-        pool = ID_POOLS[role]
-        k = min(k, len(pool))
-        return random.sample(pool, k)
+def _calendar_for(ts):
+    first, last = (np.datetime64(int(t), "s").astype("datetime64[D]").astype(object) for t in (ts.min(), ts.max()))
+    return Calendar(first, last)
 
-    start = datetime.fromisoformat(start_date).date()
-    end = datetime.fromisoformat(end_date).date()
+@profiled
+def validate_data(out_dir, fmt="csv", chunk_rows=500_000, samples=5, stores=None):
+    """
+    Check a generated dataset in chunked, vectorized passes (bounded memory) and return
+    {output: {check: {"checked", "violations", "samples"}}}:
+      geolocation  in_area (fix inside its declared AREAS polygon), closed_day (holiday or
+                   no OPENING_RULES day, e.g. Saturday), hours (outside opening hours; PRE_OPEN
+                   roles may come early)
+      log_sales    closed_day, hours, tax (tax == TAX_RATE * subtotal and total == subtotal + tax,
+                   to the cent), visit (a CASH_REGISTERS visit of the customer that carries the
+                   sale_id and spans its timestamp)
+      visits       sale (every paying visit has its sale)
+    Validates against the current config; with stores, each shard against its own store's.
+    Outputs a dataset doesn't have (e.g. --no-raw) are skipped.
+    """
+    if stores:
+        base = config_snapshot()
+        report = {}
+        try:
+            for store in stores:
+                apply_store(store, base)
+                report[store.store_id] = validate_data(os.path.join(out_dir, store.store_id), fmt, chunk_rows, samples)
+        finally:
+            apply_store(None, base)
+        return report
+    suffix = OUTPUT_FORMATS[fmt].suffix
+    path = lambda name: os.path.join(out_dir, name + suffix)
+    report = {}
 
-    repeat_ids = pick_ids("repeat_customer", 100)
+    if os.path.exists(path("geolocation")):
+        checks = {name: Check(samples) for name in ("in_area", "closed_day", "hours")}
+        index = area_index()
+        for df in read_chunks(path("geolocation"), fmt, chunk_rows):
+            if not len(df):
+                continue
+            with PROFILER.stage("validate.geolocation"):
+                area = df["area"].to_numpy(dtype=object)
+                inside = np.zeros(len(df), dtype=bool)
+                lats, lons = df["lat"].to_numpy(dtype=float), df["lon"].to_numpy(dtype=float)
+                for name in AREAS:
+                    rows = np.flatnonzero(area == name)
+                    inside[rows] = index.contains(name, lats[rows], lons[rows])
+                    # coordinates are written to 6 decimals: a fix on the edge may round just outside it
+                    for dlat, dlon in ((-COORD_EPS, 0), (COORD_EPS, 0), (0, -COORD_EPS), (0, COORD_EPS)):
+                        rows = rows[~inside[rows]]
+                        inside[rows] = index.contains(name, lats[rows] + dlat, lons[rows] + dlon)
+                checks["in_area"].add(df, ~inside)
+                ts = df["timestamp"].to_numpy(dtype=np.int64)
+                closed, hours = _hours_check(_calendar_for(ts), ts, df["role"].to_numpy(dtype=object))
+                checks["closed_day"].add(df, closed)
+                checks["hours"].add(df, hours)
+        report["geolocation"] = {name: c.report() for name, c in checks.items()}
 
-    d = start
-    while d <= end:
-        special = d in SPECIAL_DAYS
-        wd = d.weekday()
-        if d in HOLIDAYS or wd == 5:
-            d += timedelta(days=1)
+    if os.path.exists(path("log_sales")):
+        checks = {name: Check(samples) for name in ("closed_day", "hours", "tax", "visit")}
+        unpaid = Check(samples)
+        has_visits = os.path.exists(path("visits"))
+        visits = read_chunks(path("visits"), fmt, chunk_rows) if has_visits else iter(())
+        paying = {}  # sale_id -> (device_id, arrival, leave) of visits read so far and not yet matched
+        last_arrival = None
+        for df in read_chunks(path("log_sales"), fmt, chunk_rows):
+            if not len(df):
+                continue
+            with PROFILER.stage("validate.log_sales"):
+                ts = df["timestamp"].to_numpy(dtype=np.int64)
+                closed, hours = _hours_check(_calendar_for(ts), ts)
+                checks["closed_day"].add(df, closed)
+                checks["hours"].add(df, hours)
+                subtotal, tax, total = (df[c].to_numpy(dtype=float) for c in ("subtotal", "tax", "total"))
+                checks["tax"].add(df, (np.abs(tax - subtotal * TAX_RATE) > 0.005 + 1e-9) |
+                                      (np.abs(total - (subtotal + tax)) > 0.005 + 1e-9))
+                if not has_visits:
+                    continue
+                # both outputs are time-ordered: read visits up to this chunk's last sale, and drop
+                # the ones that ended before its first (no later sale can match them)
+                while last_arrival is None or last_arrival <= ts[-1]:
+                    chunk = next(visits, None)
+                    if chunk is None:
+                        break
+                    if len(chunk):
+                        last_arrival = int(chunk["arrival"].iloc[-1])
+                        chunk = chunk[chunk["sale_id"].astype(str) != ""]
+                        unpaid.checked += len(chunk)
+                        paying.update(zip(chunk["sale_id"].astype(str), zip(
+                            chunk["device_id"].astype(str), chunk["arrival"].tolist(), chunk["leave"].tolist(),
+                            chunk["areas"].astype(str), chunk.index)))
+                matched = np.zeros(len(df), dtype=bool)
+                for j, (sale_id, customer, t) in enumerate(zip(df["sale_id"].astype(str), df["customer_id"].astype(str),
+                                                                ts.tolist())):
+                    visit = paying.pop(sale_id, None)
+                    matched[j] = (visit is not None and visit[0] == customer and visit[1] <= t <= visit[2]
+                                  and "CASH_REGISTERS" in visit[3].split("|"))
+                checks["visit"].add(df, ~matched)
+                stale = [sale_id for sale_id, visit in paying.items() if visit[2] < ts[0]]
+                if stale:
+                    unpaid.add(pd.DataFrame([{"sale_id": s, "device_id": paying[s][0]} for s in stale]),
+                               np.ones(len(stale), dtype=bool), checked=False)
+                    for sale_id in stale:
+                        del paying[sale_id]
+        for _ in visits:
+            pass  # exhaust the reader
+        if paying:
+            unpaid.add(pd.DataFrame([{"sale_id": s, "device_id": v[0]} for s, v in paying.items()]),
+                       np.ones(len(paying), dtype=bool), checked=False)
+        report["log_sales"] = {name: c.report() for name, c in checks.items()}
+        if has_visits:
+            report["visits"] = {"sale": unpaid.report()}
+    return report
+
+def print_validation(report, indent=""):
+    """Violation table of validate_data's report; returns the total number of violations."""
+    total = 0
+    for output, checks in report.items():
+        if checks and all("violations" not in c for c in checks.values()):
+            print(f"{indent}{output}/")
+            total += print_validation(checks, indent + "  ")
             continue
+        for name, c in checks.items():
+            total += c["violations"]
+            print(f"{indent}{output:<12} {name:<11} {c['checked']:>12,} checked {c['violations']:>10,} violations")
+            for row in c["samples"]:
+                print(f"{indent}    {row}")
+    return total
+
+# -------------------------
+# Dry run
+# -------------------------
+DRY_RUN_PERCENTILES = (5, 50, 95)
+DRY_RUN_PASSES = 5          # most timed calibration passes; the estimate uses their median
+DRY_RUN_DAYS_PER_PASS = 30  # one timed pass per this many planned days
+DRY_RUN_MIN_DAYS = 14       # fewer planned days than this: rows only, the run itself is about as cheap
+
+def _output_bytes(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+    return os.path.getsize(path)
+
+def _calibrate(d, seed, raw, interval=SAMPLE_SECONDS, formats=OUTPUT_FORMATS, passes=1):
+    """Generate and write one day in each of formats: {fmt: ({output: bytes per row}, seconds)}.
+    seconds is the median over `passes` generations and writes, so one slow pass does not skew it;
+    a format's one-off imports are paid before timing by writing its smallest table once."""
+    import tempfile  # deferred: only the dry run writes scratch files
+    from statistics import median
+    times = []
+    for _ in range(passes):  # same seed every pass, so only the timing varies
+        t0 = perf_counter()
+        geo, sales, visits, summaries = generate_day(d, None, seed, raw, interval)
+        times.append(perf_counter() - t0)
+    generate_s = median(times)
+    tables = dict(zip(SUMMARY_OUTPUTS, summaries))
+    if raw:
+        tables.update(geolocation=geo, log_sales=sales, visits=visit_geo_rows(visits, 0))
+    columns = dict(zip(SUMMARY_OUTPUTS, (occupancy_columns(), FOOTFALL_COLUMNS, REVENUE_COLUMNS)),
+                   geolocation=GEO_COLUMNS, log_sales=SALES_COLUMNS, visits=VISIT_COLUMNS)
+    smallest = min(tables, key=lambda name: len(tables[name]))
+    result = {}
+    for fmt in formats:
+        writer = OUTPUT_FORMATS[fmt]
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                with writer(os.path.join(tmp, "warmup" + writer.suffix), columns[smallest]) as out:
+                    out.write(tables[smallest])
+            except ImportError:
+                continue  # parquet without pyarrow
+            times = []
+            for _ in range(passes):
+                per_row, write_s = {}, 0.0
+                for name, table in tables.items():
+                    path = os.path.join(tmp, name + writer.suffix)
+                    t0 = perf_counter()
+                    with writer(path, columns[name]) as out:
+                        out.write(table)
+                    write_s += perf_counter() - t0
+                    per_row[name] = _output_bytes(path) / max(len(table), 1)
+                times.append(write_s)
+        result[fmt] = (per_row, generate_s + median(times))
+    return result
+
+@profiled
+def estimate_data(start_date, end_date, seed=SEED, detect_prob=0.4, stores=None, raw=True, interval=SAMPLE_SECONDS,
+                  fmt=None):
+    """
+    Rows, bytes and runtime of generate_data(start_date, end_date, ...) without emitting a point.
+    Every day is planned exactly as the real run plans it (same seeds), so sales, visits and the
+    summary tables have exact row counts; geolocation rows are independent detections, a segment
+    of m sampling intervals giving Binomial(m + 1, detect_prob) rows. Per role and area the report has the
+    expected count and DRY_RUN_PERCENTILES (normal approximation of the binomial).
+    Bytes per row and seconds per geolocation row come from generating and writing one
+    calibration day (the one with the most typical planned load) in fmt (every format when None),
+    timed as the median of one pass per DRY_RUN_DAYS_PER_PASS planned days, at most DRY_RUN_PASSES.
+    Under DRY_RUN_MIN_DAYS planned days there is no calibration and "formats" is empty.
+    """
+    from statistics import NormalDist  # deferred: only the dry run needs it
+    slots = {}      # (role, area) -> minute slots
+    rows = dict.fromkeys(SUMMARY_OUTPUTS + ("log_sales", "visits"), 0)
+    day_slots = []  # (slots, store, day, seed) for the calibration pick
+    n_days = 0
+    base = config_snapshot() if stores else None
+    t0 = perf_counter()
+    try:
+        for store in stores or [None]:
+            store_seed = seed
+            if store:
+                apply_store(store, base)
+                store_seed = store.seed(seed)
+            for d in open_days(start_date, end_date):
+                rng, _ = day_rngs(d, store_seed)
+                segments, sales = plan_day(d, None, rng, store_seed)
+                n_days += 1
+                midnight = datetime.combine(d, time())
+                total, first, lo, hi = 0, {}, None, None
+                for device_id, role, area, s, e in segments:
+                    m = (e - s) // (interval * SECOND) + 1
+                    slots[(role, area)] = slots.get((role, area), 0) + m
+                    total += m
+                    if device_id not in first or s < first[device_id][1]:
+                        first[device_id] = (role, s)
+                    lo = s if lo is None or s < lo else lo
+                    hi = e if hi is None or e > hi else hi
+                day_slots.append((total, store, d, store_seed))
+                rows["log_sales"] += len(sales)
+                rows["visits"] += len(first)
+                rows["occupancy"] += (hi - lo) // MINUTE + 1 if segments else 0
+                rows["footfall"] += len({(s.hour, role) for role, s in first.values()})
+                rows["revenue"] += len({sale["timestamp"][:13] for sale in sales})
+        plan_s = perf_counter() - t0
+        if not day_slots:
+            return None
+
+        mean = sum(n for n, *_ in day_slots) / len(day_slots)
+        cal_slots, cal_store, cal_day, cal_seed = min(day_slots, key=lambda x: abs(x[0] - mean))
+        calibration = {}
+        if n_days >= DRY_RUN_MIN_DAYS:
+            if cal_store:
+                apply_store(cal_store, base)
+            passes = min(DRY_RUN_PASSES, max(1, n_days // DRY_RUN_DAYS_PER_PASS))
+            calibration = _calibrate(cal_day, cal_seed, raw, interval, [fmt] if fmt else OUTPUT_FORMATS, passes)
+    finally:
+        if stores:
+            apply_store(None, base)
 
-        # Workers
-        for area, s, e in manager_shift(d):
-            georows += emit_points_for_segment(ID_POOLS["manager"][0], "manager", area, s, e)
-
-        cashier_windows = cashier_shifts(d)
-        for cid, (area, s, e) in zip(pick_ids("cashier", len(cashier_windows)), cashier_windows):
-            georows += emit_points_for_segment(cid, "cashier", area, s, e)
-
-        butch_windows = butchery_shifts(d)
-        for bid, (area, s, e) in zip(pick_ids("butcher", len(butch_windows)), butch_windows):
-            georows += emit_points_for_segment(bid, "butcher", area, s, e)
-
-        for (area, s, e) in delivery_shifts(d):
-            for did in pick_ids("delivery_guy", 2):
-                georows += emit_points_for_segment(did, "delivery_guy", area, s, e)
-
-        for (area, s, e) in general_worker_shifts(d):
-            for gid in pick_ids("general_worker", 2):
-                georows += emit_points_for_segment(gid, "general_worker", area, s, e)
-
-        for (area, s, e) in senior_general_shift(d):
-            georows += emit_points_for_segment(ID_POOLS["senior_general_worker"][0], "senior_general_worker", area, s, e)
-
-        for (area, s, e) in security_shift(d):
-            sid = random.choice(ID_POOLS["security_guy"])
-            georows += emit_points_for_segment(sid, "security_guy", area, s, e)
-
-        # Customers
-        todays_repeat = []
-        for rid in repeat_ids:
-            go_today = (wd in (3,4) and random.random() < 0.7) or (wd in (6,0,1,2) and random.random() < 0.35)
-            if special and not go_today and random.random() < 0.15:
-                go_today = True
-            if go_today: todays_repeat.append(rid)
-
-        one_time_count = random.randint(3,7)
-        if special: one_time_count = int(math.ceil(one_time_count * 1.3))
-        todays_one_time = pick_ids("one_time_customer", one_time_count)
-
-        np_count = random.randint(10,35)
-        if special: np_count = int(math.ceil(np_count * 1.3))
-        todays_np = pick_ids("not_paying", np_count)
-
-        nophone_count = random.randint(15,25)
-        if special: nophone_count = int(math.ceil(nophone_count * 1.3))
-        todays_nophone = pick_ids("no_phone", nophone_count)
-
-        for cust_id in todays_repeat + todays_one_time + todays_np:
-            role = "repeat_customer" if cust_id in todays_repeat else ("not_paying" if cust_id in todays_np else "one_time_customer")
-            segs = plan_customer_trip(d, is_repeat=(role=="repeat_customer"), not_paying=(role=="not_paying"), special=special)
-            if not segs: continue
-            for (area, s, e) in segs:
-                georows += emit_points_for_segment(cust_id, role, area, s, e)
-            if role != "not_paying":
-                regs = [(s,e) for (a,s,e) in segs if a=="CASH_REGISTERS"]
-                if regs:
-                    s,e = regs[-1]
-                    dwell = sum(int((e2-s2).total_seconds()//60) for (a2,s2,e2) in segs if a2!="PARKING")
-                    sales.append(build_sale(cust_id, e, dwell))
-
-        for cust_id in todays_nophone:
-            segs = plan_customer_trip(d, no_phone=True, special=special)
-            if segs:
-                regs = [(s,e) for (a,s,e) in segs if a=="CASH_REGISTERS"]
-                if regs:
-                    s,e = regs[-1]
-                    dwell = sum(int((e2-s2).total_seconds()//60) for (a2,s2,e2) in segs if a2!="PARKING")
-                    sales.append(build_sale(cust_id, e, dwell))
-
-        d += timedelta(days=1)
-
-    geo_df = pd.DataFrame(georows, columns=["device_id", "lat", "lon", "timestamp", "accuracy_m", "role", "area"])
-    sales_df = pd.DataFrame(sales, columns=["sale_id", "timestamp", "customer_id", "subtotal", "tax", "total", "payment_method"])
-
-    geo_path = os.path.join(out_dir, "geolocation.csv")
-    sales_path = os.path.join(out_dir, "log_sales.csv")
-    geo_df.to_csv(geo_path, index=False, encoding="utf-8")
-    sales_df.to_csv(sales_path, index=False, encoding="utf-8")
-
-    print(f"[OK] Wrote {len(geo_df):,} rows → {geo_path}")
-    print(f"[OK] Wrote {len(sales_df):,} rows → {sales_path}")
+    z = {q: NormalDist().inv_cdf(q / 100) for q in DRY_RUN_PERCENTILES}
+    def binomial(n):
+        mu, sd = n * detect_prob, math.sqrt(n * detect_prob * (1 - detect_prob))
+        return {"slots": n, "expected": round(mu, 1),
+                **{f"p{q}": int(min(n, max(0, round(mu + zq * sd)))) for q, zq in z.items()}}
+    by_role_area = {f"{role}/{area}": binomial(n) for (role, area), n in sorted(slots.items())}
+    by_role, by_area = {}, {}
+    for (role, area), n in slots.items():
+        by_role[role] = by_role.get(role, 0) + n
+        by_area[area] = by_area.get(area, 0) + n
+    geo = binomial(sum(slots.values()))
+    if raw:
+        rows["geolocation"] = geo["expected"]
+    else:
+        for name in ("log_sales", "visits"):
+            rows.pop(name)
+    scale = sum(slots.values()) / max(cal_slots, 1)  # calibration day -> whole run, by planned load
+    formats = {}
+    for fmt, (per_row, seconds) in calibration.items():
+        size = {name: int(n * per_row.get(name, 0)) for name, n in rows.items()}
+        formats[fmt] = {"bytes": size, "total_bytes": sum(size.values()), "seconds": round(seconds * scale, 1)}
+    return {
+        "days": n_days, "stores": len(stores) if stores else 1, "detect_prob": detect_prob,
+        "geolocation": geo,
+        "by_role": {r: binomial(n) for r, n in sorted(by_role.items())},
+        "by_area": {a: binomial(n) for a, n in sorted(by_area.items())},
+        "by_role_area": by_role_area,
+        "rows": rows,
+        "formats": formats,
+        "calibration_day": cal_day.isoformat() if calibration else None,
+        "dry_run_seconds": round(perf_counter() - t0, 2),
+        "plan_seconds": round(plan_s, 2),
+    }
+
+def _size(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:,.0f} {unit}"
+        n /= 1024
+    return f"{n:,.1f} TB"
+
+def print_estimate(est, workers=1):
+    pct = [f"p{q}" for q in DRY_RUN_PERCENTILES]
+    print(f"Dry run: {est['days']:,} open days x {est['stores']} store(s), detect_prob {est['detect_prob']}")
+    for title, group in (("role", est["by_role"]), ("area", est["by_area"]), ("role/area", est["by_role_area"])):
+        print(f"\ngeolocation rows by {title}:")
+        print(f"  {'':<38} {'expected':>12} " + " ".join(f"{p:>12}" for p in pct))
+        for key, r in group.items():
+            print(f"  {key:<38} {r['expected']:>12,.0f} " + " ".join(f"{r[p]:>12,}" for p in pct))
+    geo = est["geolocation"]
+    print(f"  {'total':<38} {geo['expected']:>12,.0f} " + " ".join(f"{geo[p]:>12,}" for p in pct))
+    print("\nrows: " + ", ".join(f"{name} {n:,.0f}" for name, n in est["rows"].items()))
+    if not est["formats"]:
+        print(f"\n[OK] Planned in {est['plan_seconds']}s; under {DRY_RUN_MIN_DAYS} days, so bytes and runtime "
+              f"are not calibrated (the run itself is about as quick)")
+        return
+    print("\nper format:")
+    for fmt, f in est["formats"].items():
+        print(f"  {fmt:<8} {_size(f['total_bytes']):>10}   ~{f['seconds'] / max(workers, 1):,.1f}s"
+              f" with {workers} worker(s)   (" + ", ".join(f"{n} {_size(b)}" for n, b in f["bytes"].items()) + ")")
+    print(f"\n[OK] Planned in {est['plan_seconds']}s, estimated in {est['dry_run_seconds']}s "
+          f"(calibration day {est['calibration_day']})")
 
 # -------------------------
 # CLI
 # -------------------------
 if __name__ == "__main__":
+    import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--start", default="2024-01-01", help="Start date YYYY-MM-DD")
     parser.add_argument("--end",   default="2024-01-30", help="End date YYYY-MM-DD")
     parser.add_argument("--out",   default=".", help="Output directory (default: current folder)")
+    parser.add_argument("--flush-rows", type=int, default=None,
+                        help="Flush output every N rows instead of at the end of each day")
+    parser.add_argument("--workers", type=int, default=1, help="Generate days in N processes (output is identical)")
+    parser.add_argument("--seed", type=int, default=SEED, help=f"Master seed (default: {SEED})")
+    parser.add_argument("--format", choices=sorted(OUTPUT_FORMATS), default="csv", help="Output format (default: csv)")
+    parser.add_argument("--cache", default=None,
+                        help="Directory for cached day partitions; reruns only regenerate changed days")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print per-stage timings/counters and write them to <out>/profile.json")
+    parser.add_argument("--stores", default=None,
+                        help="JSON list of store definitions; simulates the chain with output sharded per store")
+    parser.add_argument("--stream", default=None, metavar="SINK",
+                        help="Stream events as time-ordered JSON lines instead of writing files: "
+                             "'-' (stdout), tcp://host:port, unix:///path or a file to append to")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="With --stream: simulated seconds per wall second (default: as fast as possible)")
+    parser.add_argument("--no-raw", action="store_true",
+                        help="Skip geolocation/log_sales/visits and only write the occupancy/footfall/revenue summaries")
+    parser.add_argument("--time-index", action="store_true",
+                        help="Also write geolocation_time_index.csv with the byte offset of every hour (csv only)")
+    parser.add_argument("--interval", type=int, default=SAMPLE_SECONDS,
+                        help=f"Sampling interval in seconds: one detection chance per device per interval (default: {SAMPLE_SECONDS})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Plan the run without emitting: print expected rows, bytes per format and runtime")
+    parser.add_argument("--validate", action="store_true",
+                        help="Check the dataset in --out (of --format) instead of generating; writes <out>/validation.json")
+    parser.add_argument("--chunk-rows", type=int, default=500_000, help="With --validate: rows read per pass")
     args = parser.parse_args()
+    if args.interval < 1:
+        parser.error("--interval must be at least 1 second")
+    if args.time_index and args.format != "csv":
+        parser.error("--time-index needs --format csv")
+    if args.stream and (args.stores or args.no_raw):
+        parser.error("--stream emits one store's raw events; it cannot be combined with --stores or --no-raw")
+
+    if args.dry_run:
+        est = estimate_data(args.start, args.end, seed=args.seed, raw=not args.no_raw, interval=args.interval,
+                            stores=load_stores(args.stores) if args.stores else None, fmt=args.format)
+        if est is None:
+            parser.error("no open days in --start..--end")
+        print_estimate(est, args.workers)
+        raise SystemExit
+
+    if args.validate:
+        report = validate_data(args.out, args.format, args.chunk_rows,
+                               stores=load_stores(args.stores) if args.stores else None)
+        with open(os.path.join(args.out, "validation.json"), "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        violations = print_validation(report)
+        print(f"[{'OK' if not violations else 'FAIL'}] {violations:,} violations → {os.path.join(args.out, 'validation.json')}")
+        raise SystemExit(1 if violations else 0)
+
+    if args.stream:
+        run_stream(args.start, args.end, args.stream, speed=args.speed, seed=args.seed, interval=args.interval)
+        raise SystemExit
 
-    generate_data(args.start, args.end, args.out)
+    generate_data(args.start, args.end, args.out, flush_rows=args.flush_rows, workers=args.workers, seed=args.seed,
+                  fmt=args.format, cache_dir=args.cache, profile=args.profile,
+                  stores=load_stores(args.stores) if args.stores else None, time_index=args.time_index,
+                  raw=not args.no_raw, interval=args.interval)
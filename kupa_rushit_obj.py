@@ -1,3 +1,15 @@
+"""
+The people of the simulation as one compact registry (used by kupa_rashit_funs).
+Every person is an integer id in a Registry - the same number is the device code of
+GeoColumns - and the classes below are __slots__ views on one row of it.
+"""
+
+import bisect
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
 # POLYGONS
 PARKING_POLYGON = 'polygon(i will fll it later)'
 SUPER_MARKET_POLYGON = 'polygon(i will fll it later)'
@@ -30,29 +42,134 @@ each minute there will be a ramdom statistic of 40% precent that a person is get
 """
 
 
+# -------------------------
+# Registry
+# -------------------------
+class Registry:
+    """
+    Everyone who can show up, array-backed: id i has names[i] and role roles[role_of[i]];
+    each role's ids are one contiguous range, in the order of the pools passed in.
+    Leave (vacations, days off) is an interval index: a sorted (start, end, kind) list per
+    person plus a day -> ids-on-leave map, so is_available is one set lookup and
+    available(role, d) is a cached list per day. Roles nobody ever takes leave in (all
+    the customers) cost nothing per day however large they are.
+    """
+    __slots__ = ("names", "roles", "role_of", "starts", "leave_seed", "leave_years",
+                 "_leave", "_off", "_on_leave", "_available")
+
+    def __init__(self, pools):
+        """pools: {role: [device ids]}."""
+        self.names = [name for ids in pools.values() for name in ids]
+        self.roles = list(pools)
+        counts = [len(ids) for ids in pools.values()]
+        self.role_of = np.repeat(np.arange(len(counts), dtype=np.int8), counts)
+        self.starts = np.concatenate([[0], np.cumsum(counts)]).tolist()
+        self.clear_leave()
+
+    def __len__(self):
+        return len(self.names)
+
+    def ids(self, role):
+        r = self.roles.index(role)
+        return range(self.starts[r], self.starts[r + 1])
+
+    def role(self, pid):
+        return self.roles[self.role_of[pid]]
+
+    def person(self, pid):
+        return ROLE_CLASSES.get(self.role(pid), person)(self, pid)
+
+    def clear_leave(self, seed=None):
+        self.leave_seed = seed
+        self.leave_years = set()
+        self._leave = {}       # pid -> sorted [(start ordinal, end ordinal, kind)]
+        self._off = {}         # day ordinal -> {pid on leave}
+        self._on_leave = set() # roles with any leave at all
+        self._available = {}   # (role, day ordinal or None) -> [pid]
+
+    def add_leave(self, pid, start, end, kind="vacation"):
+        """Take pid off work from start to end (dates, inclusive)."""
+        lo, hi = start.toordinal(), end.toordinal()
+        bisect.insort(self._leave.setdefault(pid, []), (lo, hi, kind))
+        for day in range(lo, hi + 1):
+            self._off.setdefault(day, set()).add(pid)
+        self._on_leave.add(self.role(pid))
+        self._available.clear()
+
+    def leave(self, pid):
+        """pid's leave as [(start date, end date, kind)], by start."""
+        return [(date.fromordinal(lo), date.fromordinal(hi), kind) for lo, hi, kind in self._leave.get(pid, ())]
+
+    def is_available(self, pid, d):
+        return pid not in self._off.get(d.toordinal(), ())
+
+    def available(self, role, d):
+        """List of the ids of role not on leave on d, in id order."""
+        key = (role, d.toordinal() if role in self._on_leave else None)
+        ids = self._available.get(key)
+        if ids is None:
+            off = self._off.get(key[1], ())
+            ids = self._available[key] = [pid for pid in self.ids(role) if pid not in off]
+        return ids
+
 class person:
-    def __init__(self):
-        pass
-    def vacation(self):
+    __slots__ = ("registry", "pid")
+
+    def __init__(self, registry, pid):
+        self.registry = registry
+        self.pid = pid
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.device_id!r})"
+
+    @property
+    def device_id(self):
+        return self.registry.names[self.pid]
+
+    @property
+    def role(self):
+        return self.registry.role(self.pid)
+
+    def available(self, d):
+        return self.registry.is_available(self.pid, d)
+
+    def vacation(self, dates, kind="vacation"):
         """
         vacation will get list of dates and in these dates there will be no data
+        consecutive dates are stored as one interval of the registry's leave index
         """
-        pass
+        dates = sorted(set(dates))
+        i = 0
+        while i < len(dates):
+            j = i
+            while j + 1 < len(dates) and dates[j + 1] - dates[j] == timedelta(days=1):
+                j += 1
+            self.registry.add_leave(self.pid, dates[i], dates[j], kind)
+            i = j + 1
+
     def one_day_before_vacation(self):
         """
         there will be more workers and more customers
+        returns the day before each of this person's vacations
         """
-        pass
-    def entering_market(self):
+        return [start - timedelta(days=1) for start, _, kind in self.registry.leave(self.pid) if kind == "vacation"]
+
+    def entering_market(self, segments):
         """
         because we work with geolocated data we want to let the analyst to know when the object come into the supermarket
         for that we create the parking lot data - almost every customer will get detected in the parking lot before it entering the supermarket
         note that will be customers that will not detect in the parking lot for making a bit noise for the students
+        returns this person's first (area, start) in a day's segments, None if absent
         """
-        pass
+        mine = [(s, area) for dev, _, area, s, _ in segments if dev == self.device_id]
+        if not mine:
+            return None
+        start, area = min(mine)
+        return area, start
+
 # workers
 class worker(person):
-    pass
+    __slots__ = ()
 
 class manerger(worker):
     """
@@ -61,7 +178,7 @@ class manerger(worker):
     makes a tour twice a day in the office
     when the maneger in cavation there is a replacment (new id) that comes from 8 to 5. the maneger gows one time to vacation of week and one day off
     """
-    pass # comes from 8 to 5 and not moving much
+    __slots__ = ()  # comes from 8 to 5 and not moving much
 
 class cashier(worker):
     """
@@ -71,7 +188,7 @@ class cashier(worker):
     the cashier is mostly in the CASHE_REGISTERS_POLYGON
     overall there are 15 different casherers that can go to shifts
     """
-    pass
+    __slots__ = ()
 
 class butcher(worker):
     """
@@ -79,14 +196,14 @@ class butcher(worker):
     all time the buchery is open there are 2 employees each time
     there are all in all 4 buchers that can fulfill the shifts
     """
-    pass
+    __slots__ = ()
 
 class delivery_guy(worker):
     """
     the delivery guy comes at ~6:00 AM at monday and thursday and leaves around ~6:30
     there are 8 different delivery guys
     """
-    pass
+    __slots__ = ()
 
 class general_worker(worker):
     """
@@ -96,14 +213,14 @@ class general_worker(worker):
     in friday they stay 15:00
     
     """
-    pass
+    __slots__ = ()
 class senior_general_worker(worker):
     """
     there is one senior general worker that cames around 6:30 each day and leaves at 20:00.
     at monday and thursday he comes at 6 with the delivery guy
     he comes every day
     """
-    pass
+    __slots__ = ()
 
 class securiy_guy(worker):
     """
@@ -111,45 +228,60 @@ class securiy_guy(worker):
     Low accuracy range - the accuracy is big so the geolocation is not that accurate
     there are 4 security gys
     """
-    pass
+    __slots__ = ()
 
 # customers
-class cursomer(person):
-    pass
-    def purchase(self):
+class customer(person):
+    __slots__ = ()
+
+    def purchase(self, stay_minutes, amount_fn, tax_rate, rng=random):
         """
         function to insert log of customer bill
         the function get as input time of stay (from stay_time func)
-        and return number of the bill in New Shekels with 17% precent
+        and return number of the bill in New Shekels with tax_rate added
         the time of the purchase will be the last timestamp at cashier_zone_area
+        amount_fn(stay_minutes, rng) gives the subtotal (kupa_rashit_funs.purchase_amount_from_dwell)
         """
-        pass
-    def stay_time(self):
+        subtotal = round(amount_fn(stay_minutes, rng), 2)
+        return round(subtotal + round(subtotal * tax_rate, 2), 2)
+
+    def stay_time(self, segments):
         """
         function that will calculate hou much the customer is in the market - the more it stay the more it purchase
+        minutes from the first segment start to the last segment end of this customer in a day's segments
         """
-        pass
+        mine = [(s, e) for dev, _, _, s, e in segments if dev == self.device_id]
+        if not mine:
+            return 0
+        return int((max(e for _, e in mine) - min(s for s, _ in mine)).total_seconds() // 60)
 
 class repeat_customer(customer):
     """
     customer that comes twice a week in thursday/friday and some day in sunday - wednesday. they stay more in thursday/friday
     """
-    pass # 100 overall
+    __slots__ = ()  # 100 overall
 
-class one_time_customer(customers):
+class one_time_customer(customer):
     """
     comes once in 2 month
     """
-    pass # 3-7 per day
+    __slots__ = ()  # 3-7 per day
 
 class no_phone(customer):
     """
     has onlly function of purchase
     """
-    pass # 15-25 a day
+    __slots__ = ()  # 15-25 a day
 
-class not_paying(castomer):
+class not_paying(customer):
     """
     childs or peaple that don't want to buy but have phone - only geolocation data
     """
-    pass # childrens and peaple -- 10-35 a day
\ No newline at end of file
+    __slots__ = ()  # childrens and peaple -- 10-35 a day
+
+ROLE_CLASSES = {
+    "manager": manerger, "cashier": cashier, "butcher": butcher, "delivery_guy": delivery_guy,
+    "general_worker": general_worker, "senior_general_worker": senior_general_worker,
+    "security_guy": securiy_guy, "repeat_customer": repeat_customer,
+    "one_time_customer": one_time_customer, "no_phone": no_phone, "not_paying": not_paying,
+}